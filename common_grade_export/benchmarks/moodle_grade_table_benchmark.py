@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Сравнение построения таблицы оценок Moodle: прежний способ (словари по студентам
+и активностям, затем DataFrame из записей) и GradeTableBuilder (заполнение столбцов).
+Данные gradereport_user_get_grades_table генерируются, результаты сравниваются
+
+Запуск из common_grade_export: python3 benchmarks/moodle_grade_table_benchmark.py
+"""
+
+import argparse
+import re
+import sys
+import time
+from argparse import Namespace
+from pathlib import Path
+
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from exporters.moodle_exporter import Main
+
+
+def parse_person_table(main, data, users_params):
+    grades_data = []
+    for person in data:
+        user_id = person["userid"]
+        person_grades = dict(
+            userid=user_id,
+            userfullname=person["userfullname"],
+            activities=[],
+            **users_params[str(user_id)],
+        )
+        if main.args.options and "github" in main.args.options:
+            person_grades["github"] = users_params[str(user_id)]["github"]
+
+        for activity in person["tabledata"]:
+            itemname_key = "itemname"
+            if type(activity) == dict and itemname_key in activity:
+                item_classes = set(activity[itemname_key].get("class").split(" "))
+
+                # if item has skipped class -> go to next item
+                if main.skip_item_classes & item_classes:
+                    continue
+                activity_id = None
+                # if item has class 'leve1' -> it's Course total (we hope)
+                if main.level1_class not in item_classes:
+                    activity_name_raw_content = activity[itemname_key]["content"]  # html
+                    activity_name = activity_name_raw_content.rpartition("</a>")[0].rsplit('">')[-1]    # name
+                    activity_id = re.search(r"grade\.php\?id=(\d+)", activity_name_raw_content)
+                    activity_id = activity_id.group(1) if activity_id else None     # id
+                    activity["grade"]["content"] = activity["grade"]["content"].rsplit(">", 1)[-1]
+                else:
+                    activity_name = "total"
+                    if activity["grade"]["content"] == "-":
+                        activity["grade"]["content"] = "0,0"  # issue #13
+                    activity["percentage"]["content"] = "0,0 %"
+
+                to_float_from_comma = lambda x: (
+                    float(x.replace(",", ".")) if x != "-" else "-"
+                )
+
+                person_grades["activities"].append(
+                    {
+                        "activity_name": activity_name,
+                        "activity_id": activity_id,
+                        "grade": activity["grade"]["content"],
+                        "percentage": to_float_from_comma(
+                            activity["percentage"]["content"].split(" ")[0]
+                        ),
+                        "contributiontocoursetotal": activity[
+                            "contributiontocoursetotal"
+                        ][
+                            "content"
+                        ],  # ????
+                    }
+                )
+
+        grades_data.append(person_grades)
+
+    return grades_data
+
+
+def build_records(main, data, users_params):
+    """Прежний путь: parse_person_table и записи для DataFrame"""
+    grades_data = parse_person_table(main, data, users_params)
+    grades_type = "percentage" if main.args.percentages else "grade"
+    grades_for_table = []
+    for item in grades_data:
+        person_grades = {}
+        person_grades["fullname"] = item["userfullname"]
+        person_grades["username"] = item["username"]
+        person_grades["email"] = item["email"]
+        if main.args.options and "github" in main.args.options:
+            person_grades["github"] = item["github"]
+        person_grades["last_access"] = item["last_access"]
+        for activity in item["activities"]:
+            item_name = (
+                f"{activity['activity_name']} (id={activity['activity_id']})"
+                if activity["activity_id"]
+                else activity["activity_name"]
+            )
+            person_grades[item_name] = activity[grades_type]
+        grades_for_table.append(person_grades)
+    return DataFrame(grades_for_table)
+
+
+def generate_tables(persons: int, items: int):
+    """Таблицы оценок в формате gradereport_user_get_grades_table и данные пользователей"""
+    tables = []
+    users_params = {}
+    for user_id in range(persons):
+        tabledata = [
+            {"itemname": {"class": "level1 category", "content": "Course"}},
+            [],
+        ]
+        for item in range(items):
+            grade = "-" if (user_id + item) % 7 == 0 else f"{(user_id * item) % 100},00"
+            tabledata.append(
+                {
+                    "itemname": {
+                        "class": "level2 leveleven item b1b column-itemname",
+                        "content": f'<a title="Link" class="gradeitemheader" '
+                        f'href="https://moodle/mod/assign/grade.php?id={1000 + item}">Task {item}</a>',
+                    },
+                    "grade": {"content": f'<i class="icon"></i>{grade}'},
+                    "percentage": {"content": "-" if grade == "-" else f"{grade} %"},
+                    "contributiontocoursetotal": {"content": "-"},
+                }
+            )
+        tabledata.append(
+            {
+                "itemname": {"class": "level1 levelodd item", "content": "Course total"},
+                "grade": {"content": f"{user_id % 100},00"},
+                "percentage": {"content": "-"},
+                "contributiontocoursetotal": {"content": "-"},
+            }
+        )
+        tables.append({"userid": user_id, "userfullname": f"Student {user_id}", "tabledata": tabledata})
+        users_params[str(user_id)] = {
+            "last_access": "2024-01-01 10:00:00",
+            "username": f"student{user_id}",
+            "email": f"student{user_id}@example.com",
+            "github": "-",
+        }
+    return tables, users_params
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark Moodle grade table building")
+    parser.add_argument("--persons", type=int, default=1500, help="Students in course (default: 1500)")
+    parser.add_argument("--items", type=int, default=150, help="Grade items (default: 150)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"{args.persons} students x {args.items} grade items")
+
+    for percentages in (False, True):
+        main = Main(Namespace(percentages=percentages, options=None))
+        # прежний путь изменяет данные, поэтому каждому способу - свои
+        tables, users_params = generate_tables(args.persons, args.items)
+        start = time.perf_counter()
+        expected = build_records(main, tables, users_params)
+        records_time = time.perf_counter() - start
+
+        tables, users_params = generate_tables(args.persons, args.items)
+        start = time.perf_counter()
+        result = main.build_grade_table(tables, users_params)
+        builder_time = time.perf_counter() - start
+
+        assert_frame_equal(result, expected)
+        mode = "percentages" if percentages else "grades"
+        print(f"{mode:<12} records {records_time:6.2f}s   builder {builder_time:6.2f}s")
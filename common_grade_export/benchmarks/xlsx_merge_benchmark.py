@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Сравнение объединения XLSX-листов: прежний способ (полная загрузка и копирование
+по ячейкам) и потоковый (read_only источники, write_only результат).
+Каждый вариант запускается в отдельном процессе, чтобы пиковый RSS не смешивался
+
+Запуск из common_grade_export: python3 benchmarks/xlsx_merge_benchmark.py
+"""
+
+import argparse
+import resource
+import subprocess
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+from openpyxl import Workbook, load_workbook
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils.download_file import write_excel_values
+
+
+def create_workbook(path: str, rows: int, columns: int):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("grades")
+    sheet.append([f"column_{column}" for column in range(columns)])
+    for row in range(rows):
+        sheet.append(
+            [f"student_{row}" if column == 0 else (row * column) % 100 / 10 for column in range(columns)]
+        )
+    workbook.save(path)
+
+
+def merge_full_load(contents: list[bytes], output):
+    """Прежняя реализация merge_multiple_excels"""
+    merged_workbook = Workbook()
+    for content in contents:
+        temp_wb = load_workbook(BytesIO(content), data_only=True)
+        for sheet_name in temp_wb.sheetnames:
+            source_sheet = temp_wb[sheet_name]
+            new_sheet = merged_workbook.create_sheet(title=f"{sheet_name}")
+            for row in source_sheet.iter_rows():
+                for cell in row:
+                    new_sheet[cell.coordinate].value = cell.value
+    merged_workbook.save(output)
+
+
+METHODS = {"full_load": merge_full_load, "streaming": write_excel_values}
+
+
+def run_method(method: str, path: str, sheets: int):
+    content = Path(path).read_bytes()
+    start = time.perf_counter()
+    METHODS[method]([content] * sheets, BytesIO())
+    elapsed = time.perf_counter() - start
+    # ru_maxrss в Linux - в килобайтах
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{method:<10} time {elapsed:8.2f}s   peak RSS {peak_rss:8.1f} MB")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark XLSX merge and value flattening")
+    parser.add_argument("--rows", type=int, default=50000, help="Rows per sheet (default: 50000)")
+    parser.add_argument("--columns", type=int, default=60, help="Columns per sheet (default: 60)")
+    parser.add_argument("--sheets", type=int, default=1, help="Sheets to merge (default: 1)")
+    parser.add_argument(
+        "--workbook", default="/tmp/xlsx_merge_benchmark.xlsx", help="Path for generated workbook"
+    )
+    parser.add_argument("--method", choices=METHODS, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.method:
+        run_method(args.method, args.workbook, args.sheets)
+        sys.exit(0)
+
+    print(f"Generating {args.rows}x{args.columns} workbook: {args.workbook}")
+    create_workbook(args.workbook, args.rows, args.columns)
+    for method in METHODS:
+        subprocess.run(
+            [sys.executable, __file__, "--method", method, "--workbook", args.workbook, "--sheets", str(args.sheets)],
+            check=True,
+        )
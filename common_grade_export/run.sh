@@ -25,5 +25,10 @@ GOOGLE_CRED=$EXPORTER_GOOGLE_CONF
 
 GOOGLE_CRED_DOCKER_PATH=/app/secret.json
 CRED_DOCKER_PATH=/app/system_cred.json
+# state outlives the container: skipping unchanged sheets and --resume need it
+STATE_DIR=${EXPORTER_STATE_DIR:-/tmp/grade_exporter_state}
 
-docker run --rm -v $GOOGLE_CRED:$GOOGLE_CRED_DOCKER_PATH -v $SYSTEM_CRED:$CRED_DOCKER_PATH grade_exporter:latest course_to_spreadsheet_exporter.py --table_id $TABLE_ID --sheet_id $SHEET_ID --google_cred $GOOGLE_CRED_DOCKER_PATH --system_cred $CRED_DOCKER_PATH
\ No newline at end of file
+mkdir -p $STATE_DIR
+
+# extra arguments are passed to the exporter, e.g. ./run.sh --resume
+docker run --rm -v $GOOGLE_CRED:$GOOGLE_CRED_DOCKER_PATH -v $SYSTEM_CRED:$CRED_DOCKER_PATH -v $STATE_DIR:/app/state grade_exporter:latest course_to_spreadsheet_exporter.py --table_id $TABLE_ID --sheet_id $SHEET_ID --google_cred $GOOGLE_CRED_DOCKER_PATH --system_cred $CRED_DOCKER_PATH --state_path /app/state/export_state.sqlite "$@"
\ No newline at end of file
@@ -0,0 +1,34 @@
+#!/bin/bash
+
+# Run from common_grade_export
+# Starts resident export service (see src/service_config.example.json)
+
+docker build -t 'grade_exporter:latest' .
+
+
+SYSTEM_CRED=/tmp/system_cred.json
+
+cat > $SYSTEM_CRED <<JSON
+{
+    "moodle": "$MOODLE_TOKEN",
+    "dis": "$DIS_ACCESS_TOKEN",
+    "stepik": {
+        "client_id": "$STEPIK_CLIENT_ID",
+        "client_secret": "$STEPIK_CLIENT_SECRET"
+    }
+}
+JSON
+
+
+SERVICE_CONFIG=$EXPORTER_SERVICE_CONF
+STATE_DIR=${EXPORTER_STATE_DIR:-/tmp/grade_exporter_state}
+GOOGLE_CRED=$EXPORTER_GOOGLE_CONF
+
+mkdir -p $STATE_DIR
+
+docker run -d --restart unless-stopped --name grade_exporter_service \
+    -v $GOOGLE_CRED:/app/secret.json \
+    -v $SYSTEM_CRED:/app/system_cred.json \
+    -v $SERVICE_CONFIG:/app/service_config.json \
+    -v $STATE_DIR:/app/state \
+    grade_exporter:latest export_service.py --config /app/service_config.json
@@ -1,7 +1,12 @@
 import logging
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from io import StringIO
 from utils.download_file import download_sheets, get_sheets_service_and_token
+from utils.rate_limit import format_throttle_stats, google_call, throttle_stats
+from utils.state_store import StateStore, row_key
 
 logging.basicConfig(
     level=logging.INFO,
@@ -12,13 +17,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# значение результата строки, обработанной с ошибкой
+ERROR_RESULT = "- (error)"
+
 
 class BaseGoogleSpreadsheetDataProcessor:
+    # заголовок результатов обработки, записываемых в управляющую таблицу
+    results_header: list[str] = []
+
     def __init__(
         self,
         table_id: str,
         sheet_id: str,
         google_cred: str,
+        workers: int = 1,
+        system_limits: dict[str, int] | None = None,
+        state_path: str | None = None,
+        force: bool = False,
+        resume: bool = False,
     ):
         """
         Инициализация базовых полей
@@ -27,12 +43,31 @@ class BaseGoogleSpreadsheetDataProcessor:
             table_id (str): ID управляющей таблицы
             sheet_id (str): ID листа в управляющей таблицы
             google_cred (str): Путь к файлу учетных данных Google
+            workers (int): Число строк управляющей таблицы, обрабатываемых одновременно
+            system_limits (dict[str, int]): Ограничения числа одновременных обращений
+                к отдельным системам, например {"moodle": 2, "yadisk": 4}
+            state_path (str): Путь к SQLite-файлу состояния. Если задан, строки,
+                данные которых не изменились с прошлого запуска, не перезаписываются
+            force (bool): Перезаписывать данные независимо от сохраненного состояния
+            resume (bool): Продолжить последний незавершенный запуск управляющей таблицы,
+                обработав только строки, не завершенные в нем успешно (нужен state_path)
         """
         self.table_id = table_id
         self.sheet_id = sheet_id
         self.google_cred = google_cred
-        self.results = []
+        self.workers = max(1, workers)
+        # число потоков пула строк; подклассы с конвейером этапов могут его увеличить
+        self.pool_size = self.workers
+        self.system_limits = {
+            system: threading.BoundedSemaphore(limit)
+            for system, limit in (system_limits or {}).items()
+        }
+        self.state = StateStore(state_path) if state_path else None
+        self.force = force
+        self.resume = resume
+        self.results = [list(self.results_header)]
         self.has_errors = False
+        self.throttle_stats = throttle_stats()
 
     def validate_google_credentials(self):
         # TODO: validate creds and wite access to table
@@ -55,12 +90,98 @@ class BaseGoogleSpreadsheetDataProcessor:
         else:
             return None
 
+    def start_run(self):
+        """
+        Сбрасывает результаты и флаг ошибок перед очередным запуском process(),
+        чтобы один экземпляр можно было запускать многократно
+        """
+        self.results = [list(self.results_header)]
+        self.has_errors = False
+        self.throttle_stats = throttle_stats()
+
     def set_errors_flag(self, flag=True):
         self.has_errors = flag
 
     def check_errors(self):
         return not self.has_errors
 
+    def system_limit(self, system: str):
+        """
+        Контекст, ограничивающий число одновременных обращений к системе.
+        Для систем без ограничения действует только общий лимит workers
+        """
+        return self.system_limits.get(system) or nullcontext()
+
+    def get_unchanged_output(self, key: str, fingerprint: str) -> str | None:
+        """
+        Возвращает сохраненный результат строки (ссылку), если отпечаток ее данных
+        не изменился с прошлого запуска. Без хранилища состояния или с force - None
+        """
+        if self.state is None or self.force:
+            return None
+        stored = self.state.get_fingerprint(key)
+        if stored and stored[0] == fingerprint:
+            return stored[1]
+        return None
+
+    def save_fingerprint(self, key: str, fingerprint: str, output: str | None = None):
+        """
+        Сохраняет отпечаток данных строки и ее результат
+        """
+        if self.state is not None:
+            self.state.set_fingerprint(key, fingerprint, output)
+
+    def map_rows(self, handler, rows) -> list:
+        """
+        Обрабатывает строки управляющей таблицы пулом из self.workers потоков.
+        При наличии хранилища состояния статусы строк сохраняются в манифест запуска,
+        а при self.resume успешно обработанные в прерванном запуске строки
+        не обрабатываются повторно - берется их сохраненный результат
+
+        Args:
+            handler: функция обработки одной строки, сама обрабатывает свои ошибки
+            rows: строки управляющей таблицы
+        Return:
+            list: результаты handler в порядке строк управляющей таблицы
+        """
+        rows = list(rows)
+        if self.state is None:
+            with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+                return list(executor.map(handler, rows))
+
+        run_id = self.state.start_run(
+            f"{type(self).__name__}|{self.table_id}|{self.sheet_id}", self.resume
+        )
+        done_rows = self.state.get_done_rows(run_id)
+        keys = [row_key(row) for row in rows]
+        unfinished = {
+            index
+            for index, key in enumerate(keys)
+            if index not in done_rows or done_rows[index][0] != key
+        }
+        for index in unfinished:
+            self.state.set_row_status(run_id, index, keys[index], "pending")
+        if self.resume:
+            logger.info(
+                f"Запуск {run_id}: строк к обработке {len(unfinished)} из {len(rows)}"
+            )
+
+        def process_tracked(index: int) -> list:
+            if index not in unfinished:
+                return done_rows[index][1]
+            self.state.set_row_status(run_id, index, keys[index], "running")
+            result = handler(rows[index])
+            status = "failed" if result[-1] == ERROR_RESULT else "done"
+            self.state.set_row_status(run_id, index, keys[index], status, result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            results = list(executor.map(process_tracked, range(len(rows))))
+
+        failed = any(result[-1] == ERROR_RESULT for result in results)
+        self.state.finish_run(run_id, "failed" if failed else "done")
+        return results
+
     def process(self):
         """
         Обрабатывает данные экспорта
@@ -82,7 +203,8 @@ class BaseGoogleSpreadsheetDataProcessor:
         Записывает результаты обработки в управляющую таблицу в table_range (по умолчанию A1), очищая старые данные.
         rows, cols используются для создания нового листа, в случае его отсутствия
 
-        Используется self.results - должен иметь формат list[list[str]] (список вставляемых строк), например:
+        Используется self.results - должен иметь формат list[list[str]] (список вставляемых строк),
+        при продолжении запуска он содержит и сохраненные результаты ранее обработанных строк, например:
         [
             [header1, header2, ...],
             [row1_col1, row1_col2, ...],
@@ -90,14 +212,27 @@ class BaseGoogleSpreadsheetDataProcessor:
         ]
         """
         client, _ = get_sheets_service_and_token(self.google_cred)
-        sh = client.open_by_key(self.table_id)
+        sh = google_call("sheets_read", client.open_by_key, self.table_id)
 
-        sheet_title = f"{prefix}{sh.get_worksheet_by_id(self.sheet_id).title}"
+        control_sheet = google_call("sheets_read", sh.get_worksheet_by_id, self.sheet_id)
+        sheet_title = f"{prefix}{control_sheet.title}"
 
         try:
-            ws = sh.worksheet(sheet_title)
-            ws.clear()
+            ws = google_call("sheets_read", sh.worksheet, sheet_title)
+            google_call("sheets_write", ws.clear)
         except:
-            ws = sh.add_worksheet(title=sheet_title, rows=rows, cols=cols)
+            ws = google_call(
+                "sheets_write", sh.add_worksheet, title=sheet_title, rows=rows, cols=cols
+            )
+
+        google_call("sheets_write", ws.append_rows, self.results, table_range=table_range)
 
-        ws.append_rows(self.results, table_range=table_range)
+    def log_throttling(self):
+        """
+        Выводит итоги ограничения частоты запросов к Google за запуск:
+        число запросов и ответов 429, время ожидания лимита и повторов
+        """
+        logger.info(
+            "Ограничение запросов Google: "
+            + format_throttle_stats(self.throttle_stats, throttle_stats())
+        )
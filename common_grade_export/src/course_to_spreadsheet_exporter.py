@@ -3,9 +3,15 @@ import csv
 import logging
 import subprocess
 import sys
+import threading
+from concurrent.futures import Future
 from json import load as json_load
 
-from base_class import BaseGoogleSpreadsheetDataProcessor
+from base_class import ERROR_RESULT, BaseGoogleSpreadsheetDataProcessor
+from exporters import dis_exporter, moodle_exporter, stepik_exporter
+from utils.arg_parser import system_limit
+from utils.http_session import create_session
+from utils.state_store import table_fingerprint
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -16,19 +22,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# exporter-модули с общим интерфейсом:
+#   parse_args(argv) - разбор аргументов CLI модуля
+#   fetch_table(args, session) -> DataFrame | None - выгрузка данных из системы
+#   write_table(args, df) - запись выгруженных данных в лист из args
+#   main(argv, session) - полный запуск модуля как скрипта
+EXPORTERS = {
+    "moodle": moodle_exporter,
+    "stepik": stepik_exporter,
+    "dis": dis_exporter,
+}
+
 
 class CourseToSpreadsheetExporter(BaseGoogleSpreadsheetDataProcessor):
+    results_header = ["subject", "table_link"]
 
     def __init__(
-            self, table_id: str, sheet_id: str, google_cred: str, system_cred_path: str
+            self,
+            table_id: str,
+            sheet_id: str,
+            google_cred: str,
+            system_cred_path: str,
+            isolated: bool = False,
+            workers: int = 1,
+            system_limits: dict[str, int] | None = None,
+            state_path: str | None = None,
+            force: bool = False,
+            resume: bool = False,
     ):
-        super().__init__(table_id, sheet_id, google_cred)
+        """
+        Инициализация экспортера
+
+        Args:
+            table_id (str): ID управляющей таблицы
+            sheet_id (str): ID листа в управляющей таблицы
+            google_cred (str): Путь к файлу учетных данных Google
+            system_cred_path (str): Путь к файлу учетных данных систем (moodle/stepik/dis)
+            isolated (bool): Запускать каждый экспорт отдельным python-процессом
+                вместо вызова exporter-модуля в текущем процессе
+            workers (int): Число одновременно выгружаемых строк
+            system_limits (dict[str, int]): Ограничения одновременных выгрузок по системам
+            state_path (str): Путь к SQLite-файлу состояния для пропуска неизменившихся листов
+            force (bool): Записывать листы независимо от сохраненного состояния
+            resume (bool): Продолжить последний незавершенный запуск, выгружая только
+                не завершенные в нем строки
+        """
+        super().__init__(
+            table_id,
+            sheet_id,
+            google_cred,
+            workers,
+            system_limits,
+            state_path,
+            force,
+            resume,
+        )
         self.systems = {"moodle", "dis", "stepik"}
         self.system_cred = self.validate_system_credentials(
             self.load_system_creds(system_cred_path)
         )
-        self.results = [["subject", "table_link"]]
         self.google_cred_path = google_cred
+        self.isolated = isolated
+        # HTTP-сессии переиспользуются всеми строками (и потоками) одной системы
+        self.sessions = {system: create_session(self.workers) for system in self.systems}
+        # выгрузки из систем текущего запуска: (system, main, additional) -> Future
+        self.fetches = {}
+        self.fetch_requests = 0
+        self.fetches_lock = threading.Lock()
 
     @staticmethod
     def load_system_creds(path: str) -> dict:
@@ -49,6 +109,7 @@ class CourseToSpreadsheetExporter(BaseGoogleSpreadsheetDataProcessor):
         return {key: system_cred[key] for key in valid_systems}
 
     def process(self) -> bool:
+        self.start_run()
         control_data = self.get_control_data()
 
         if control_data:
@@ -63,32 +124,46 @@ class CourseToSpreadsheetExporter(BaseGoogleSpreadsheetDataProcessor):
                     "additional_export_info",
                 ],
             )
-            for export_line in control_data:
-                subject = export_line.pop("subject")
-                try:
-                    logger.info(f">>>>> Экспорт для дисциплины {subject}")
-                    is_ok = self.process_data(**export_line)
-                    self.results.append(
-                        [
-                            subject,
-                            f"https://docs.google.com/spreadsheets/d/{export_line['table_id']}/edit?gid={export_line['sheet_id']}",
-                        ]
-                        if is_ok
-                        else [subject, "- (error)"]
-                    )
-                except Exception as e:
-                    logger.info(f"!!!!! Ошибка при экспорте дисциплины {subject}: {e}")
-                    self.results.append([subject, "- (error)"])
-                    self.set_errors_flag()
-                finally:
-                    logger.info(f">>>>> Конец экспорта для дисциплины {subject}")
+            rows = list(control_data)
+            self.fetches = {}
+            self.fetch_requests = 0
+            self.results.extend(self.map_rows(self.process_row, rows))
+            if not self.isolated:
+                logger.info(
+                    f"Выгрузок из систем: {len(self.fetches)} на {self.fetch_requests} строк, "
+                    f"сэкономлено выгрузок: {self.fetch_requests - len(self.fetches)}"
+                )
 
             self.write_process_result()
+            self.log_throttling()
             return self.check_errors()
         else:
             logger.error("Ошибка получения данных для экспорта")
             return False
 
+    def process_row(self, export_line: dict) -> list[str]:
+        """
+        Выполняет выгрузку одной строки управляющей таблицы (в потоке пула)
+
+        Return:
+            list[str]: строка результата [subject, table_link]
+        """
+        subject = export_line.pop("subject")
+        try:
+            logger.info(f">>>>> Экспорт для дисциплины {subject}")
+            if self.process_data(**export_line):
+                return [
+                    subject,
+                    f"https://docs.google.com/spreadsheets/d/{export_line['table_id']}/edit?gid={export_line['sheet_id']}",
+                ]
+            self.set_errors_flag()
+        except Exception as e:
+            logger.info(f"!!!!! Ошибка при экспорте дисциплины {subject}: {e}")
+            self.set_errors_flag()
+        finally:
+            logger.info(f">>>>> Конец экспорта для дисциплины {subject}")
+        return [subject, ERROR_RESULT]
+
     def process_data(self, system, **export_info) -> bool:
         """
         Обрабатывает одну строку данных - одиночная выгрузка
@@ -100,11 +175,24 @@ class CourseToSpreadsheetExporter(BaseGoogleSpreadsheetDataProcessor):
             raise ValueError(
                 f"Для системы {system} нет валидных данных в {self.system_cred}"
             )
-        return self.run_export(system, **export_info)
+        with self.system_limit(system):
+            return self.run_export(system, **export_info)
 
     def run_export(self, system: str, **export_info) -> bool:
         """
-        Запускает exporter-модуль с выгрузкой данных
+        Запускает exporter-модуль с выгрузкой данных: в текущем процессе
+        или, в режиме isolated, отдельным python-процессом
+
+        Return:
+            bool: экспорт завершился успешно
+        """
+        if self.isolated:
+            return self.run_export_subprocess(system, **export_info)
+        return self.run_export_in_process(system, **export_info)
+
+    def run_export_subprocess(self, system: str, **export_info) -> bool:
+        """
+        Запускает exporter-модуль отдельным процессом
 
         Return:
             bool: exporter run command returncode == 0
@@ -113,15 +201,109 @@ class CourseToSpreadsheetExporter(BaseGoogleSpreadsheetDataProcessor):
         result = subprocess.run(exporter_run_cmd, stdout=sys.stdout, stderr=sys.stderr)
         return result.returncode == 0
 
+    def run_export_in_process(self, system: str, **export_info) -> bool:
+        """
+        Выгружает данные exporter-модулем в текущем процессе и записывает их в лист строки.
+        Строки с одинаковым источником (system, main_export_info, additional_export_info)
+        используют одну выгрузку
+
+        Return:
+            bool: exporter не завершился через SystemExit с ненулевым кодом
+        """
+        exporter = EXPORTERS[system]
+        exporter_args = exporter.parse_args(
+            self.create_export_args(system, **export_info)
+        )
+        source = (
+            system,
+            export_info.get("main_export_info"),
+            export_info.get("additional_export_info"),
+        )
+        try:
+            table = self.fetch_once(source, exporter_args)
+            if table is not None:
+                self.write_if_changed(
+                    exporter, exporter_args, table, source, **export_info
+                )
+        except SystemExit as e:
+            # exporter-модули сообщают об ошибках через SystemExit/exit(1)
+            if e.code not in (None, 0):
+                logger.error(f"Экспорт {system} завершился с ошибкой: {e.code}")
+                return False
+        return True
+
+    def write_if_changed(
+        self,
+        exporter,
+        exporter_args,
+        table,
+        source: tuple,
+        table_id: str,
+        sheet_id: str,
+        **_,
+    ):
+        """
+        Записывает выгруженные данные в лист строки, если их отпечаток
+        отличается от записанного в этот лист в прошлый раз
+        """
+        state_key = "|".join(str(part) for part in (*source, table_id, sheet_id))
+        fingerprint = table_fingerprint(table)
+        if self.get_unchanged_output(state_key, fingerprint) is not None:
+            logger.info(
+                f"Данные {source} не изменились, запись в {table_id}:{sheet_id} пропущена"
+            )
+            return
+        exporter.write_table(exporter_args, table)
+        self.save_fingerprint(state_key, fingerprint, f"{table_id}:{sheet_id}")
+
+    def fetch_once(self, source: tuple, exporter_args):
+        """
+        Выгружает данные источника один раз за запуск: первая строка источника
+        выполняет выгрузку, остальные ждут и получают ее результат (или ее ошибку)
+
+        Args:
+            source (tuple): (system, main_export_info, additional_export_info)
+            exporter_args: аргументы exporter-модуля системы
+        """
+        with self.fetches_lock:
+            self.fetch_requests += 1
+            future = self.fetches.get(source)
+            is_owner = future is None
+            if is_owner:
+                future = self.fetches[source] = Future()
+
+        if is_owner:
+            system = source[0]
+            try:
+                future.set_result(
+                    EXPORTERS[system].fetch_table(
+                        exporter_args, session=self.sessions[system]
+                    )
+                )
+            except BaseException as e:
+                future.set_exception(e)
+        else:
+            logger.info(f"Используется уже выгруженный источник {source}")
+        return future.result()
+
     def create_export_cmd(
         self, system: str, table_id: str, sheet_id: str, **export_info
     ) -> list[str]:
         """
         Формирует полную команду запуска модуля экспортера
         """
-        cmd = ["python3"]
-        cmd.extend(self.get_extended_system_command(system, **export_info))
-        cmd.extend(
+        cmd = ["python3", f"exporters/{system}_exporter.py"]
+        cmd.extend(self.create_export_args(system, table_id, sheet_id, **export_info))
+        return cmd
+
+    def create_export_args(
+        self, system: str, table_id: str, sheet_id: str, **export_info
+    ) -> list[str]:
+        """
+        Формирует аргументы командной строки модуля экспортера
+        """
+        args = self.get_extended_system_command(system, **export_info)
+        args.extend(
             [
                 "--table_id",
                 table_id,
@@ -131,7 +313,7 @@ class CourseToSpreadsheetExporter(BaseGoogleSpreadsheetDataProcessor):
                 self.google_cred_path,
             ]
         )
-        return cmd
+        return args
 
     def get_extended_system_command(
         self,
@@ -144,7 +326,6 @@ class CourseToSpreadsheetExporter(BaseGoogleSpreadsheetDataProcessor):
         """
         CMD = {
             "moodle": [
-                "exporters/moodle_exporter.py",
                 "--moodle_token",
                 self.system_cred["moodle"],
                 "--url",
@@ -157,7 +338,6 @@ class CourseToSpreadsheetExporter(BaseGoogleSpreadsheetDataProcessor):
                 "github",
             ],
             "stepik": [
-                "exporters/stepik_exporter.py",
                 "--client_id",
                 self.system_cred["stepik"]["client_id"],
                 "--client_secret",
@@ -172,7 +352,6 @@ class CourseToSpreadsheetExporter(BaseGoogleSpreadsheetDataProcessor):
                 additional_export_info,
             ],
             "dis": [
-                "exporters/dis_exporter.py",
                 "--checker_filter",
                 main_export_info,
                 "--checker_token",
@@ -198,6 +377,39 @@ def parse_args():
         required=True,
         help="Path to system (moodle/stepik/dis) credentials file",
     )
+    parser.add_argument(
+        "--isolated",
+        action="store_true",
+        help="Run each exporter in a separate python process",
+    )
+    parser.add_argument(
+        "--workers",
+        default=1,
+        type=int,
+        help="Number of control rows exported concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--system_limit",
+        type=system_limit,
+        action="append",
+        default=[],
+        help="Max concurrent exports for a system, e.g. moodle=2 (can be repeated)",
+    )
+    parser.add_argument(
+        "--state_path",
+        default="export_state.sqlite",
+        help="Path to SQLite state file used to skip unchanged sheets (default: export_state.sqlite)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Write all sheets even if data did not change since the last run",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the last unfinished run of this control table, processing only unfinished rows",
+    )
     return parser.parse_args()
 
 
@@ -209,6 +421,12 @@ if __name__ == "__main__":
         sheet_id=args.sheet_id,
         google_cred=args.google_cred,
         system_cred_path=args.system_cred,
+        isolated=args.isolated,
+        workers=args.workers,
+        system_limits=dict(args.system_limit),
+        state_path=args.state_path,
+        force=args.force,
+        resume=args.resume,
     )
 
     if not exporter.process():
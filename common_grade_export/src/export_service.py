@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Сервис периодического экспорта: держит обработчики управляющих таблиц
+(учетные данные, импортированные модули, HTTP-сессии) между запусками
+и запускает их по расписанию
+"""
+
+import argparse
+import logging
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from json import load as json_load
+
+from base_class import BaseGoogleSpreadsheetDataProcessor
+from course_to_spreadsheet_exporter import CourseToSpreadsheetExporter
+from spreadsheet_to_yadisk_duplicator import SpreadheetToYaDiskDuplicator
+from utils.schedule import CronSchedule, IntervalSchedule
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(levelname) -10s %(asctime)s %(module)s:%(lineno)s %(funcName)s %(message)s",
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+    ],
+)
+logger = logging.getLogger(__name__)
+
+
+def create_course_exporter(config: dict, job: dict) -> BaseGoogleSpreadsheetDataProcessor:
+    return CourseToSpreadsheetExporter(
+        table_id=job["table_id"],
+        sheet_id=job["sheet_id"],
+        google_cred=config["google_cred"],
+        system_cred_path=config["system_cred"],
+        workers=config.get("workers", 1),
+        system_limits=config.get("system_limits"),
+        state_path=config.get("state_path"),
+    )
+
+
+def create_yadisk_duplicator(config: dict, job: dict) -> BaseGoogleSpreadsheetDataProcessor:
+    return SpreadheetToYaDiskDuplicator(
+        table_id=job["table_id"],
+        sheet_id=job["sheet_id"],
+        google_cred=config["google_cred"],
+        yadisk_token=config["yadisk_token"],
+        yadisk_dir=job["yadisk_dir"],
+        workers=config.get("workers", 1),
+        system_limits=config.get("system_limits"),
+        state_path=config.get("state_path"),
+    )
+
+
+PROCESSORS = {
+    "course_export": create_course_exporter,
+    "yadisk_duplicate": create_yadisk_duplicator,
+}
+
+
+class CoalescingRunner:
+    """
+    Запускает process() обработчика одной управляющей таблицы.
+    Запросы на запуск во время выполнения не накладываются, а объединяются
+    в один повторный запуск после завершения текущего
+    """
+
+    def __init__(self, name: str, processor: BaseGoogleSpreadsheetDataProcessor):
+        self.name = name
+        self.processor = processor
+        self.lock = threading.Lock()
+        self.running = False
+        self.pending = False
+
+    def trigger(self, executor: ThreadPoolExecutor):
+        with self.lock:
+            if self.running:
+                self.pending = True
+                logger.info(
+                    f"{self.name}: запуск уже выполняется, повторный запуск объединен"
+                )
+                return
+            self.running = True
+        executor.submit(self.run)
+
+    def run(self):
+        while True:
+            logger.info(f"{self.name}: запуск")
+            try:
+                if self.processor.process():
+                    logger.info(f"{self.name}: запуск завершен")
+                else:
+                    logger.error(f"{self.name}: запуск завершен с ошибками")
+            except Exception as e:
+                logger.error(f"{self.name}: ошибка запуска: {e}")
+
+            with self.lock:
+                if not self.pending:
+                    self.running = False
+                    return
+                self.pending = False
+
+
+class ScheduledJob:
+    def __init__(
+        self, runner: CoalescingRunner, schedule: IntervalSchedule | CronSchedule
+    ):
+        self.runner = runner
+        self.schedule = schedule
+        self.next_run = datetime.now()
+
+
+class ExportService:
+    def __init__(self, config: dict):
+        """
+        Args:
+            config (dict): конфигурация сервиса, см. service_config.example.json
+        """
+        self.jobs = []
+        # задания одной управляющей таблицы используют общий обработчик и объединяются
+        runners = {}
+        for job in config["jobs"]:
+            job_type = job["type"]
+            if job_type not in PROCESSORS:
+                raise ValueError(
+                    f"Неизвестный тип задания {job_type}, доступны: {list(PROCESSORS)}"
+                )
+            key = (job_type, job["table_id"], str(job["sheet_id"]))
+            if key not in runners:
+                runners[key] = CoalescingRunner(
+                    f"{job_type} {job['table_id']}:{job['sheet_id']}",
+                    PROCESSORS[job_type](config, job),
+                )
+            self.jobs.append(ScheduledJob(runners[key], self.create_schedule(job)))
+
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(runners)))
+        self.stop_event = threading.Event()
+
+    @staticmethod
+    def create_schedule(job: dict) -> IntervalSchedule | CronSchedule:
+        if "cron" in job:
+            return CronSchedule(job["cron"])
+        if "interval" in job:
+            return IntervalSchedule(job["interval"])
+        raise ValueError(f"Для задания не задано расписание (interval или cron): {job}")
+
+    def run(self, run_now: bool = True):
+        """
+        Запускает задания по расписанию до вызова stop()
+
+        Args:
+            run_now (bool): выполнить все задания сразу при старте
+        """
+        now = datetime.now()
+        for job in self.jobs:
+            job.next_run = now if run_now else job.schedule.next_after(now)
+            logger.info(
+                f"{job.runner.name}: {job.schedule}, следующий запуск {job.next_run}"
+            )
+
+        while not self.stop_event.is_set():
+            now = datetime.now()
+            for job in self.jobs:
+                if job.next_run <= now:
+                    job.runner.trigger(self.executor)
+                    job.next_run = job.schedule.next_after(now)
+            next_run = min(job.next_run for job in self.jobs)
+            self.stop_event.wait(max(0.0, (next_run - datetime.now()).total_seconds()))
+
+        logger.info("Остановка сервиса, ожидание текущих запусков")
+        self.executor.shutdown(wait=True)
+
+    def stop(self, *_):
+        self.stop_event.set()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run control table exports on a schedule in a resident process"
+    )
+    parser.add_argument(
+        "--config", required=True, help="Path to service config (JSON with jobs)"
+    )
+    parser.add_argument(
+        "--no_run_on_start",
+        action="store_true",
+        help="Wait for the first scheduled time instead of running all jobs at start",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    with open(args.config, encoding="utf-8") as file:
+        service = ExportService(json_load(file))
+
+    signal.signal(signal.SIGTERM, service.stop)
+    signal.signal(signal.SIGINT, service.stop)
+
+    service.run(run_now=not args.no_run_on_start)
@@ -7,6 +7,9 @@ import requests
 import yadisk
 
 from utils.arg_parser import arg_parser_dis
+from utils.columnar import write_columnar
+from utils.gspread import get_pygsheets_client
+from utils.rate_limit import google_call
 
 INT_MASS = [{"one": 1, "two": 2, "what?": 3}]
 
@@ -14,9 +17,10 @@ INT_MASS = [{"one": 1, "two": 2, "what?": 3}]
 EXPORT_URL = "https://slides-checker.moevm.info/get_csv/?limit=0&offset=0&sort=&order="
 
 
-def load_data_from_dis(checker_filter, checker_token):
+def fetch_dis_data(checker_filter, checker_token, session=None):
+    """Download checker results, returns raw csv text and DataFrame"""
     url = f"{EXPORT_URL}&{checker_filter}&access_token={checker_token}"
-    csv_data = requests.get(url).content.decode("utf-8")
+    csv_data = (session or requests).get(url).content.decode("utf-8")
 
     if csv_data:
         df = pd.read_csv(StringIO(csv_data))
@@ -24,6 +28,13 @@ def load_data_from_dis(checker_filter, checker_token):
     else:
         df_data = pd.DataFrame(INT_MASS)
 
+    return csv_data, df_data
+
+
+def load_data_from_dis(checker_filter, checker_token, session=None):
+    """Download checker results and save the raw csv for the command line run"""
+    csv_data, df_data = fetch_dis_data(checker_filter, checker_token, session)
+
     csv_path = "./dis_results.csv"
     # print(csv_data)
     with open(csv_path, mode="w", encoding="utf-8") as file:
@@ -32,6 +43,26 @@ def load_data_from_dis(checker_filter, checker_token):
     return csv_path, df_data
 
 
+def write_df_to_sheet(df_data, google_token, table_id, sheet_name=None, sheet_id=None):
+    gc = get_pygsheets_client(google_token)
+    sh = google_call("sheets_read", gc.open_by_key, table_id)
+
+    if sheet_id:
+        wk_content = sh.worksheet("id", sheet_id)
+    else:
+        try:
+            sh.worksheets("title", sheet_name)
+        except:
+            google_call("sheets_write", sh.add_worksheet, sheet_name)
+
+        wk_content = sh.worksheet_by_title(sheet_name)
+    # print(df_data)
+    google_call(
+        "sheets_write", wk_content.set_dataframe, df=df_data, start="A1", copy_head=True
+    )
+    print(f"writed t0 {table_id} {sheet_id}")
+
+
 def write_data_to_table(
     checker_token,
     checker_filter,
@@ -41,25 +72,15 @@ def write_data_to_table(
     sheet_id=None,
     yandex_token=None,
     yandex_path=None,
+    session=None,
+    columnar=None,
 ):
-    csv_path, df_data = load_data_from_dis(checker_filter, checker_token)
+    csv_path, df_data = load_data_from_dis(checker_filter, checker_token, session)
+    if columnar:
+        write_columnar(df_data, csv_path.removesuffix(".csv"), columnar)
 
     if google_token and (sheet_name or sheet_id) and table_id:
-        gc = pygsheets.authorize(service_file=google_token)
-        sh = gc.open_by_key(table_id)
-
-        if sheet_id:
-            wk_content = sh.worksheet("id", sheet_id)
-        else:
-            try:
-                sh.worksheets("title", sheet_name)
-            except:
-                sh.add_worksheet(sheet_name)
-
-            wk_content = sh.worksheet_by_title(sheet_name)
-        # print(df_data)
-        wk_content.set_dataframe(df=df_data, start="A1", copy_head=True)
-        print(f"writed t0 {table_id} {sheet_id}")
+        write_df_to_sheet(df_data, google_token, table_id, sheet_name, sheet_id)
 
     # write data to yandex disk
     if yandex_token and yandex_path:
@@ -75,8 +96,26 @@ def write_data_to_table(
         )
 
 
-def main():
-    args = arg_parser_dis()
+def parse_args(argv=None):
+    return arg_parser_dis(argv)
+
+
+# Common exporter interface: download checker results as DataFrame
+def fetch_table(args, session=None):
+    # in-process runs need no csv file in cwd, concurrent rows would overwrite it
+    _, df_data = fetch_dis_data(args.checker_filter, args.checker_token, session)
+    return df_data
+
+
+# Common exporter interface: write downloaded results to sheet from args
+def write_table(args, df_data):
+    write_df_to_sheet(
+        df_data, args.google_token, args.table_id, args.sheet_name, args.sheet_id
+    )
+
+
+def main(argv=None, session=None):
+    args = parse_args(argv)
     write_data_to_table(
         checker_token=args.checker_token,
         checker_filter=args.checker_filter,
@@ -86,6 +125,8 @@ def main():
         sheet_id=args.sheet_id,
         yandex_token=args.yandex_token,
         yandex_path=args.yandex_path,
+        session=session,
+        columnar=args.columnar,
     )
 
 
@@ -1,14 +1,103 @@
 #!/usr/bin/python3
 import datetime
 import json
+import os
+import pickle
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
 import requests
-from pandas import DataFrame
+from numpy import nan
+from pandas import DataFrame, Series, concat
 
 from utils.arg_parser import arg_parser_moodle
+from utils.columnar import write_columnar
 from utils.gspread import write_data_to_table
+from utils.http_session import create_session
 
 HEADERS = {"Content-Type": "charset=iso-8859"}
+# user columns kept as text in columnar output, the rest are grades
+TEXT_COLUMNS = ["fullname", "username", "email", "github"]
+# --grades_backend -> moodle function returning course grades
+GRADE_BACKENDS = {
+    "table": "gradereport_user_get_grades_table",
+    "items": "gradereport_user_get_grade_items",
+}
+# --grades_backend -> list of per-user grades in the response
+GRADE_KEYS = {"table": "tables", "items": "usergrades"}
+# grade item id in the item link
+ITEM_ID_RE = re.compile(r"grade\.php\?id=(\d+)")
+
+
+def parse_item_name(content):
+    """Grade item column name from the item html: 'name (id=N)' or 'name'"""
+    name = content.rpartition("</a>")[0].rsplit('">')[-1]
+    activity_id = ITEM_ID_RE.search(content)
+    return f"{name} (id={activity_id.group(1)})" if activity_id else name
+
+
+def get_grade_item_column(builder, item):
+    """
+    Grade column of a gradereport_user_get_grade_items item, named like the
+    grades table column: 'name (id=cmid)' for activities. Category totals are skipped
+    """
+    if item["itemtype"] == "course":
+        return builder.get_total_column()
+    if item["itemtype"] == "category":
+        return None
+    name = item.get("itemname") or ""
+    return builder.get_column(f"{name} (id={item['cmid']})" if item.get("cmid") else name)
+
+
+class GradeTableBuilder:
+    """
+    Course grade table filled column by column: user columns are fixed once per course,
+    a grade column is preallocated for all persons when its item is first seen.
+    Grade html and percentages are parsed in build(), once per distinct value of a column
+    """
+
+    def __init__(self, size, user_fields):
+        self.size = size
+        self.user_columns = {field: [None] * size for field in user_fields}
+        self.grade_columns = {}
+        # course total is written as is, without parsing
+        self.total_column = None
+
+    def set_user(self, row, field, value):
+        self.user_columns[field][row] = value
+
+    def get_column(self, item_name):
+        column = self.grade_columns.get(item_name)
+        if column is None:
+            column = self.grade_columns[item_name] = [nan] * self.size
+        return column
+
+    def get_total_column(self):
+        self.total_column = self.get_column("total")
+        return self.total_column
+
+    def build(self, percentages):
+        parse_value = parse_percentage if percentages else strip_grade_html
+        data: dict[str, list | Series] = dict(self.user_columns)
+        for item_name, column in self.grade_columns.items():
+            values = Series(column, dtype=object)
+            if column is not self.total_column:
+                values = values.map({value: parse_value(value) for value in values.dropna().unique()})
+            data[item_name] = values.infer_objects()
+        return DataFrame(data)
+
+
+def strip_grade_html(value):
+    return value.rsplit(">", 1)[-1]
+
+
+def parse_percentage(value):
+    """'85,00 %' -> 85.0, '-' is kept"""
+    number = value.split(" ")[0]
+    return float(number.replace(",", ".")) if number != "-" else "-"
 
 
 class Main:
@@ -17,217 +106,478 @@ class Main:
     item_class = "column-itemname"
     level1_class = "level1"
 
-    @classmethod
-    def parse_person_table(cls, data, users_params):
-        grades_data = []
-        for person in data:
-            user_id = person["userid"]
-            person_grades = dict(
-                userid=user_id,
-                userfullname=person["userfullname"],
-                activities=[],
-                **users_params[str(user_id)],
-            )
-            if cls.args.options and "github" in cls.args.options:
-                person_grades["github"] = users_params[str(user_id)]["github"]
+    def __init__(self, args):
+        # instance state instead of class state: several exports may run concurrently
+        self.args = args
+
+    def build_grade_table(self, data, users_params):
+        """Build the course grade table from gradereport tables, None if there are no persons"""
+        if not data:
+            return None
 
-            # print(f'userid: {user_id} fullname: {person_grades["userfullname"]}')
+        builder = self.create_builder(len(data))
+        percentages = self.args.percentages
+        value_key = "percentage" if percentages else "grade"
+        # item html is the same for all persons: (class, content) -> grade column or None if skipped
+        item_columns = {}
+
+        for row, person in enumerate(data):
+            self.set_user_columns(builder, row, person, users_params)
 
             for activity in person["tabledata"]:
                 itemname_key = "itemname"
                 if type(activity) == dict and itemname_key in activity:
-                    item_classes = set(activity[itemname_key].get("class").split(" "))
+                    itemname = activity[itemname_key]
+                    item_key = (itemname.get("class"), itemname["content"])
+                    if item_key not in item_columns:
+                        item_columns[item_key] = self.get_item_column(builder, *item_key)
+                    column = item_columns[item_key]
 
-                    # if item has skipped class -> go to next item
-                    if cls.skip_item_classes & item_classes:
+                    if column is None:
                         continue
-                    activity_id = None
-                    # if item has class 'leve1' -> it's Course total (we hope)
-                    if cls.level1_class not in item_classes:
-                        activity_name_raw_content = activity[itemname_key]["content"]  # html
-                        activity_name = activity_name_raw_content.rpartition("</a>")[0].rsplit('">')[-1]    # name
-                        activity_id = re.search(r"grade\.php\?id=(\d+)", activity_name_raw_content)
-                        activity_id = activity_id.group(1) if activity_id else None     # id
-                        activity["grade"]["content"] = activity["grade"]["content"].rsplit(">", 1)[-1]
+                    if column is not builder.total_column:
+                        # html and percentages are parsed per column in GradeTableBuilder.build
+                        column[row] = activity[value_key]["content"]
+                    elif percentages:
+                        column[row] = 0.0
+                    elif activity["grade"]["content"] == "-":
+                        column[row] = "0,0"  # issue #13
                     else:
-                        activity_name = "total"
-                        if activity["grade"]["content"] == "-":
-                            activity["grade"]["content"] = "0,0"  # issue #13
-                        activity["percentage"]["content"] = "0,0 %"
-
-                    # print(activity_name)
-
-                    to_float_from_comma = lambda x: (
-                        float(x.replace(",", ".")) if x != "-" else "-"
-                    )
+                        column[row] = activity["grade"]["content"]
+
+        return builder.build(percentages)
+
+    def build_grade_items_table(self, usergrades, users_params):
+        """
+        Build the course grade table from gradereport_user_get_grade_items,
+        same columns as build_grade_table, None if there are no persons
+        """
+        if not usergrades:
+            return None
+
+        builder = self.create_builder(len(usergrades))
+        percentages = self.args.percentages
+        value_key = "percentageformatted" if percentages else "gradeformatted"
+        # grade item id -> grade column or None if skipped
+        item_columns = {}
+
+        for row, person in enumerate(usergrades):
+            self.set_user_columns(builder, row, person, users_params)
+
+            for item in person["gradeitems"]:
+                if item["id"] not in item_columns:
+                    item_columns[item["id"]] = get_grade_item_column(builder, item)
+                column = item_columns[item["id"]]
+
+                if column is None:
+                    continue
+                value = item.get(value_key) or "-"
+                if column is not builder.total_column:
+                    column[row] = value
+                elif percentages:
+                    column[row] = 0.0
+                elif value == "-":
+                    column[row] = "0,0"  # issue #13
+                else:
+                    column[row] = value
+
+        return builder.build(percentages)
+
+    def create_builder(self, size):
+        user_fields = ["fullname", "username", "email"]
+        if self.args.options and "github" in self.args.options:
+            user_fields.append("github")
+        user_fields.append("last_access")
+        return GradeTableBuilder(size, user_fields)
+
+    def set_user_columns(self, builder, row, person, users_params):
+        params = users_params[str(person["userid"])]
+        builder.set_user(row, "fullname", person["userfullname"])
+        for field in builder.user_columns:
+            if field != "fullname":
+                builder.set_user(row, field, params[field])
+
+    def get_item_column(self, builder, item_class, content):
+        """Grade column of an item, None for skipped items"""
+        item_classes = set(item_class.split(" "))
+
+        # if item has skipped class -> go to next item
+        if self.skip_item_classes & item_classes:
+            return None
+        # if item has class 'leve1' -> it's Course total (we hope)
+        if self.level1_class in item_classes:
+            return builder.get_total_column()
+        return builder.get_column(parse_item_name(content))
 
-                    person_grades["activities"].append(
-                        {
-                            "activity_name": activity_name,
-                            "activity_id": activity_id,
-                            "grade": activity["grade"]["content"],
-                            "percentage": to_float_from_comma(
-                                activity["percentage"]["content"].split(" ")[0]
-                            ),
-                            "contributiontocoursetotal": activity[
-                                "contributiontocoursetotal"
-                            ][
-                                "content"
-                            ],  # ????
-                        }
+    @classmethod
+    def main(cls, argv=None, session=None):
+        cls(parse_args(argv)).run(session)
+
+    def run(self, session=None):
+        """Export all courses from args, up to course_workers at once, on a shared session"""
+        course_ids = self.args.course_id
+        workers = max(1, min(self.args.course_workers, len(course_ids)))
+        # courses share one yandex file, which is updated by download-modify-upload
+        self.yandex_lock = threading.Lock()
+
+        # external session is shared between runs and is not closed here
+        # each course export may fetch grades of up to user_workers users at once
+        pool_size = workers * max(1, self.args.user_workers)
+        with nullcontext(session) if session else create_session(pool_size) as s:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(
+                    executor.map(
+                        lambda course_id: self.try_export_course(course_id, s),
+                        course_ids,
                     )
+                )
 
-            grades_data.append(person_grades)
-
-        return grades_data
+        failed = [course_id for course_id, status, _ in results if status.startswith("failed")]
+        print("Course export summary:")
+        for course_id, status, elapsed in results:
+            print(f"  course_id={course_id}: {status} ({elapsed:.1f}s)")
+        print(f"Exported {len(results) - len(failed)} of {len(results)} courses")
+        if failed:
+            raise SystemExit(f"Failed to export courses: {', '.join(failed)}")
+
+    def try_export_course(self, course_id, session):
+        """Export one course, a failure is returned as status instead of stopping other courses"""
+        start = time.perf_counter()
+        try:
+            status = self.export_course(course_id, session)
+        except (Exception, SystemExit) as e:
+            status = f"failed: {e}"
+            print(f"Export failed for course_id={course_id}: {e}")
+        return course_id, status, time.perf_counter() - start
+
+    def export_course(self, course_id, session=None):
+        df = self.load_course(course_id, session)
+
+        if df is None:
+            print(f"No solutions in course {course_id}, nothing to export")
+            return "no solutions"
+
+        # output data to csv file
+        csv_path = f"{self.args.csv_path}_{course_id}.csv"
+        df.to_csv(csv_path, sep=";", decimal=",", encoding="UTF-8")
+        if self.args.columnar:
+            write_columnar(
+                df,
+                f"{self.args.csv_path}_{course_id}",
+                self.args.columnar,
+                datetime_columns=["last_access"],
+                text_columns=TEXT_COLUMNS,
+            )
 
-    @classmethod
-    def main(cls):
-        cls.args = arg_parser_moodle()
-        for course_id in cls.args.course_id:
-            with requests.Session() as s:
-                # get enrolled users
-                res_users = s.get(
-                    f"{cls.args.url}/webservice/rest/server.php?wstoken={cls.args.moodle_token}"
-                    f"&wsfunction=core_enrol_get_enrolled_users&courseid={course_id}&moodlewsrestformat=json&moodlewssettinglang=ru",
-                    headers=HEADERS,
+        # if self.args specified write data to sheets document
+        if self.args.google_token and self.args.table_id:
+            self.write_course(course_id, df)
+        print(f"End exporting for course_id={course_id}")
+
+        # write data to yandex disk
+        if self.args.yandex_token and self.args.yandex_path:
+            # TODO: refactor нadisk
+            from utils.yandex_disk import write_sheet_to_file
+
+            with self.yandex_lock:
+                write_sheet_to_file(
+                    self.args.yandex_token,
+                    self.args.yandex_path,
+                    csv_path,
+                    sheet_name="Онлайн-курс",
                 )
-                # check status code
-                if res_users.status_code != 200:
-                    raise SystemExit(
-                        "Request error, response status code: "
-                        + str(res_users.status_code)
-                    )
 
-                users = json.loads(res_users.text)
-                # check if request is valid
-                if type(users) != list:
-                    raise SystemExit("Error: " + users["message"])
-
-                # save last accessed time for each user
-                users_params = {}
-                for item in users:
-                    users_params[str(item["id"])] = {
-                        "last_access": datetime.datetime.fromtimestamp(
-                            item["lastcourseaccess"]
-                        ).strftime("%Y-%m-%d %H:%M:%S"),
-                        "username": item.get("username", "-"),
-                        "email": item.get("email", "-"),
-                    }
-                    users_params[str(item["id"])]["github"] = (
-                        item["customfields"][0].get("value", "-")
-                        if "customfields" in item
-                        else "-"
-                    )
+            yandex_path = self.args.yandex_path
+            print(
+                f"Course {course_id} uploaded to table on Disk! Path to the table is: {yandex_path}"
+            )
+        return "exported"
+
+    def load_course(self, course_id, session=None):
+        """Download grades of a course, returns DataFrame or None if there are no solutions"""
+        # external session is shared between runs and is not closed here
+        with nullcontext(session) if session else requests.Session() as s:
+            # get enrolled users
+            res_users = s.get(
+                f"{self.args.url}/webservice/rest/server.php?wstoken={self.args.moodle_token}"
+                f"&wsfunction=core_enrol_get_enrolled_users&courseid={course_id}&moodlewsrestformat=json&moodlewssettinglang=ru",
+                headers=HEADERS,
+            )
+            # check status code
+            if res_users.status_code != 200:
+                raise SystemExit(
+                    "Request error, response status code: "
+                    + str(res_users.status_code)
+                )
 
-                # get grades
-                res_grades = s.get(
-                    f"{cls.args.url}/webservice/rest/server.php?wstoken={cls.args.moodle_token}"
-                    f"&wsfunction=gradereport_user_get_grades_table&courseid={course_id}&moodlewsrestformat=json&moodlewssettinglang=ru",
-                    headers=HEADERS,
+            users = json.loads(res_users.text)
+            # check if request is valid
+            if type(users) != list:
+                raise SystemExit("Error: " + users["message"])
+
+            # save last accessed time for each user
+            users_params = {}
+            for item in users:
+                users_params[str(item["id"])] = {
+                    "last_access": datetime.datetime.fromtimestamp(
+                        item["lastcourseaccess"]
+                    ).strftime("%Y-%m-%d %H:%M:%S"),
+                    "username": item.get("username", "-"),
+                    "email": item.get("email", "-"),
+                }
+                users_params[str(item["id"])]["github"] = (
+                    item["customfields"][0].get("value", "-")
+                    if "customfields" in item
+                    else "-"
                 )
 
-                # check status code
-                if res_grades.status_code != 200:
-                    raise SystemExit(
-                        "Request error, response status code: "
-                        + str(res_grades.status_code)
-                    )
+            if self.args.sync_dir:
+                return self.sync_course(course_id, users, users_params, s)
+
+            # get grades
+            grades = self.fetch_course_grades(course_id, users, s)
+
+        return self.build_grades(grades, users_params)
+
+    def build_grades(self, grades, users_params):
+        if self.args.grades_backend == "items":
+            return self.build_grade_items_table(grades["usergrades"], users_params)
+        return self.build_grade_table(grades["tables"], users_params)
+
+    def fetch_course_grades(self, course_id, users, session):
+        """Grades of all users: in one request or per user, see --user_workers"""
+        if self.args.user_workers:
+            return self.fetch_user_grades(course_id, get_graded_user_ids(users, self.args.graded_roles), session)
+        return self.fetch_grades(course_id, session)
+
+    def sync_course(self, course_id, users, users_params, session):
+        """
+        Incremental export: refetch grades only of users changed since the previous
+        export of the course (new users, changed lastcourseaccess, submissions waiting
+        for grading) and merge them into the saved table. Needs the grade items backend.
+        Grades changed by a teacher without a pending submission are not detected,
+        so all users are refetched every full_sync_days or when the grade items change
+        """
+        path = os.path.join(self.args.sync_dir, f"moodle_{course_id}.pkl")
+        state = load_sync_state(path, self.sync_signature())
+        access = {user["id"]: user["lastcourseaccess"] for user in users}
+        full_sync = (
+            state is None
+            or time.time() - state["synced_at"] > self.args.full_sync_days * 24 * 60 * 60
+        )
+
+        if not full_sync:
+            changed = [
+                user_id
+                for user_id in get_graded_user_ids(users, self.args.graded_roles)
+                if user_id not in state["users"]
+                or state["users"][user_id]["access"] != access[user_id]
+                or state["users"][user_id]["pending"]
+            ]
+            grades = self.fetch_user_grades(course_id, changed, session)
+            persons = grades[GRADE_KEYS[self.args.grades_backend]]
+            df = self.build_grades(grades, users_params)
+            if df is not None and list(df.columns) != list(state["table"].columns):
+                print(f"Grade items of course {course_id} changed, fetching all users")
+                full_sync = True
+            else:
+                print(f"Course {course_id}: refetched grades of {len(changed)} of {len(users)} users")
+                df, user_ids = merge_synced_rows(state, df, persons, changed, access)
+
+        if full_sync:
+            grades = self.fetch_course_grades(course_id, users, session)
+            persons = grades[GRADE_KEYS[self.args.grades_backend]]
+            df = self.build_grades(grades, users_params)
+            user_ids = [person["userid"] for person in persons]
+            state = {"synced_at": time.time(), "users": {}}
+
+        if df is None or df.empty:
+            return None
+        pending = {person["userid"]: has_pending_grades(person) for person in persons}
+        save_sync_state(
+            path,
+            {
+                "signature": self.sync_signature(),
+                "synced_at": state["synced_at"],
+                "users": {
+                    user_id: {
+                        "access": access.get(user_id),
+                        "pending": pending.get(user_id, state["users"].get(user_id, {}).get("pending", False)),
+                    }
+                    for user_id in user_ids
+                },
+                "user_ids": user_ids,
+                "table": df,
+            },
+        )
+        return df
+
+    def sync_signature(self):
+        """Options changing the table; a saved table with other options is not reused"""
+        github = bool(self.args.options and "github" in self.args.options)
+        return self.args.grades_backend, self.args.percentages, github
+
+    def fetch_grades(self, course_id, session, user_id=None):
+        """Grades response of the whole course, or of one user if user_id is given"""
+        user_param = f"&userid={user_id}" if user_id else ""
+        res_grades = session.get(
+            f"{self.args.url}/webservice/rest/server.php?wstoken={self.args.moodle_token}"
+            f"&wsfunction={GRADE_BACKENDS[self.args.grades_backend]}&courseid={course_id}{user_param}"
+            "&moodlewsrestformat=json&moodlewssettinglang=ru",
+            headers=HEADERS,
+        )
+
+        # check status code
+        if res_grades.status_code != 200:
+            raise SystemExit(
+                "Request error, response status code: "
+                + str(res_grades.status_code)
+            )
 
-                grades = json.loads(res_grades.text)
-
-                # check if request is valid
-                if "message" in grades:
-                    raise SystemExit("Error: " + grades["message"])
-
-                # parse grades data
-                grades_data = cls.parse_person_table(grades["tables"], users_params)
-
-                if len(grades_data) == 0:
-                    print("No solutions in course, nothing to export. Exiting")
-                    return
-
-                # form suitable structure for output to sheets
-                grades_for_table = []
-                grades_type = "grade"
-                if cls.args.percentages:
-                    grades_type = "percentage"
-
-                for item in grades_data:
-                    person_grades = {}
-                    person_grades["fullname"] = item["userfullname"]
-                    person_grades["username"] = item["username"]
-                    person_grades["email"] = item["email"]
-                    if cls.args.options and "github" in cls.args.options:
-                        person_grades["github"] = item["github"]
-                    person_grades["last_access"] = item["last_access"]
-                    for activity in item["activities"]:
-                        item_name = (
-                            f"{activity['activity_name']} (id={activity['activity_id']})"
-                            if activity["activity_id"]
-                            else activity["activity_name"]
-                        )
-                        person_grades[item_name] = activity[grades_type]  # issue #30
-                    grades_for_table.append(person_grades)
-
-                df = DataFrame(grades_for_table)
-
-                # output data to csv file
-                csv_path = f"{cls.args.csv_path}_{course_id}.csv"
-                df.to_csv(csv_path, sep=";", decimal=",", encoding="UTF-8")
-
-                # if cls.args specified write data to sheets document
-                if cls.args.google_token and cls.args.table_id:
-
-                    for i in range(0, len(cls.args.table_id)):
-                        if cls.args.course_id[i] == course_id:
-                            table_id = cls.args.table_id[i]
-                            break
-                        elif i == len(cls.args.table_id) - 1:
-                            table_id = cls.args.table_id[i]
-
-                    if cls.args.sheet_id:
-                        write_data_to_table(
-                            df,
-                            cls.args.google_token,
-                            table_id,
-                            sheet_id=cls.args.sheet_id[0],
-                        )
-                        print(f"writed to {table_id} {cls.args.sheet_id[0]}")
+        grades = json.loads(res_grades.text)
+
+        # check if request is valid
+        if "message" in grades:
+            raise SystemExit("Error: " + grades["message"])
+        return grades
+
+    def fetch_user_grades(self, course_id, user_ids, session):
+        """
+        Fetch grades one user per request, up to user_workers requests at once,
+        and merge them into one response in the order of user_ids
+        """
+        key = GRADE_KEYS[self.args.grades_backend]
+        if not user_ids:
+            return {key: []}
+        workers = max(1, min(self.args.user_workers, len(user_ids)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            responses = executor.map(
+                lambda user_id: self.fetch_grades(course_id, session, user_id), user_ids
+            )
+            return {key: [person for grades in responses for person in grades[key]]}
+
+    def write_course(self, course_id, df):
+        """Write course grades to the sheet selected by table_id/sheet_id/sheet_name args"""
+        for i in range(0, len(self.args.table_id)):
+            if self.args.course_id[i] == course_id:
+                table_id = self.args.table_id[i]
+                break
+            elif i == len(self.args.table_id) - 1:
+                table_id = self.args.table_id[i]
+
+        if self.args.sheet_id:
+            write_data_to_table(
+                df,
+                self.args.google_token,
+                table_id,
+                sheet_id=self.args.sheet_id[0],
+            )
+            print(f"writed to {table_id} {self.args.sheet_id[0]}")
+        else:
+            if self.args.sheet_name:
+                for i in range(0, len(self.args.sheet_name)):
+                    if self.args.course_id[i] == course_id:
+                        sheet_name = self.args.sheet_name[i]
+                        break
                     else:
-                        if cls.args.sheet_name:
-                            for i in range(0, len(cls.args.sheet_name)):
-                                if cls.args.course_id[i] == course_id:
-                                    sheet_name = cls.args.sheet_name[i]
-                                    break
-                                else:
-                                    sheet_name = (
-                                        cls.args.sheet_name[i] + " " + course_id
-                                    )
-                        else:
-                            sheet_name = "course " + course_id
-                        write_data_to_table(
-                            df, cls.args.google_token, table_id, sheet_name=sheet_name
-                        )
-                print(f"End exporting for course_id={course_id}")
-
-                # write data to yandex disk
-                if cls.args.yandex_token and cls.args.yandex_path:
-                    # TODO: refactor нadisk
-                    from utils.yandex_disk import write_sheet_to_file
-
-                    write_sheet_to_file(
-                        cls.args.yandex_token,
-                        cls.args.yandex_path,
-                        csv_path,
-                        sheet_name="Онлайн-курс",
-                    )
+                        sheet_name = self.args.sheet_name[i] + " " + course_id
+            else:
+                sheet_name = "course " + course_id
+            write_data_to_table(
+                df, self.args.google_token, table_id, sheet_name=sheet_name
+            )
 
-                    yandex_path = cls.args.yandex_path
-                    print(
-                        f"Course {cls.args.course_id} uploaded to table on Disk! Path to the table is: {yandex_path}"
-                    )
+
+def get_graded_user_ids(users, graded_roles):
+    """
+    Ids of enrolled users with one of graded_roles (role shortnames), as the course
+    grade report shows users of gradebookroles. Without graded_roles, or roles info
+    in the response, all users are kept: users without grades get no rows anyway
+    """
+    return [
+        user["id"]
+        for user in users
+        if not graded_roles
+        or "roles" not in user
+        or graded_roles & {role["shortname"] for role in user["roles"]}
+    ]
+
+
+def has_pending_grades(person):
+    """
+    Has submissions newer than their grading (grade items backend only):
+    a teacher grading them later changes no user timestamp, so the user is refetched
+    """
+    return any(
+        (item.get("gradedatesubmitted") or 0) > (item.get("gradedategraded") or 0)
+        for item in person.get("gradeitems", [])
+    )
+
+
+def load_sync_state(path, signature):
+    """Saved export of a course, None if there is none or it was made with other options"""
+    try:
+        with open(path, "rb") as file:
+            state = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    return state if state["signature"] == signature else None
+
+
+def save_sync_state(path, state):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "wb") as file:
+        pickle.dump(state, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def merge_synced_rows(state, df, persons, changed, access):
+    """
+    Saved table with rows of refetched users replaced, users no longer enrolled removed
+    and new users appended. Returns the table and user ids of its rows
+    """
+    fetched_ids = [person["userid"] for person in persons]
+    changed = set(changed)
+    saved_rows = [
+        (row, user_id)
+        for row, user_id in enumerate(state["user_ids"])
+        if user_id in access and user_id not in changed
+    ]
+    fetched_rows = {user_id: row for row, user_id in enumerate(fetched_ids)}
+    kept_ids = {user_id for _, user_id in saved_rows}
+    # saved row order is kept, new users go last
+    user_ids = [
+        user_id for user_id in state["user_ids"] if user_id in kept_ids or user_id in fetched_rows
+    ]
+    user_ids += [user_id for user_id in fetched_ids if user_id not in state["user_ids"]]
+
+    parts = [state["table"].iloc[[row for row, _ in saved_rows]]]
+    if df is not None:
+        parts.append(df)
+    merged = concat(parts, ignore_index=True)
+    # row of each user in merged: saved rows first, then fetched ones
+    positions = {user_id: i for i, (_, user_id) in enumerate(saved_rows)}
+    positions.update({user_id: len(saved_rows) + row for user_id, row in fetched_rows.items()})
+    return merged.iloc[[positions[user_id] for user_id in user_ids]].reset_index(drop=True), user_ids
+
+
+def parse_args(argv=None):
+    return arg_parser_moodle(argv)
+
+
+def fetch_table(args, session=None):
+    """Common exporter interface: download the table of the first course in args"""
+    return Main(args).load_course(args.course_id[0], session)
+
+
+def write_table(args, df):
+    """Common exporter interface: write the downloaded table to the sheet from args"""
+    Main(args).write_course(args.course_id[0], df)
+
+
+def main(argv=None, session=None):
+    Main.main(argv, session)
 
 
 if __name__ == "__main__":
-    Main.main()
+    main()
@@ -1,14 +1,22 @@
 # Run with Python 3
 import csv
 import json
+import time
 
+import pandas as pd
 import requests
 import yadisk
 
 from utils.arg_parser import arg_parser_stepik
+from utils.columnar import write_columnar
 from utils.gspread import write_data_to_table_stepik
 
-ALL_TASK_IDS = set()
+TOKEN_URL = "https://stepik.org/oauth2/token/"
+# refresh token a bit earlier than stepik expires it
+TOKEN_EXPIRY_MARGIN = 60
+
+# (client_id, client_secret) -> (access_token, expires_at)
+_tokens = {}
 
 
 # check status code and if request is valid
@@ -21,7 +29,7 @@ def check_access(response):
     data = json.loads(response.text)
 
     if "detail" in data:
-        raise SystemExit("Error: " + response["detail"])
+        raise SystemExit("Error: " + data["detail"])
     return data
 
 
@@ -39,9 +47,29 @@ def sort_steps(lesson, results):
     return sorted_steps
 
 
+# Get a token, reuse it while it is valid
+def get_token(client_id, client_secret, session=None):
+    cached = _tokens.get((client_id, client_secret))
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+
+    auth = requests.auth.HTTPBasicAuth(client_id, client_secret)
+    response = (session or requests).post(
+        TOKEN_URL,
+        data={"grant_type": "client_credentials"},
+        auth=auth,
+    )
+    data = response.json()
+    token = data.get("access_token", None)
+    if token:
+        expires_in = data.get("expires_in", 0) - TOKEN_EXPIRY_MARGIN
+        _tokens[(client_id, client_secret)] = (token, time.monotonic() + expires_in)
+    return token
+
+
 # Get info from server answer
-def parse_grades(user, url, token, sorted_steps):
-    user_meta = requests.get(
+def parse_grades(user, url, token, sorted_steps, all_task_ids, session=None):
+    user_meta = (session or requests).get(
         url + "/users/" + str(user["user"]),
         headers={"Authorization": "Bearer " + token},
     )
@@ -70,25 +98,30 @@ def parse_grades(user, url, token, sorted_steps):
     for i in sorted_steps:
         key = user["results"][i]["step_id"]
         grades.update({key: user["results"][i]["score"]})
-        global ALL_TASK_IDS
-        ALL_TASK_IDS.add(key)
+        all_task_ids.add(key)
     return grades
 
 
-def main():
-    args = arg_parser_stepik()
+def parse_args(argv=None):
+    return arg_parser_stepik(argv)
+
+
+# Common exporter interface: download course grades as DataFrame
+def fetch_table(args, session=None):
+    grades_for_table, fields = fetch_grades(args, session)
+    return pd.DataFrame(grades_for_table, columns=pd.Index(fields))
+
+
+def fetch_grades(args, session=None):
+    """Download course grades, returns grade rows (dicts) and column names"""
+    http = session or requests.Session()
     sorted_steps = []
     grades_for_table = []
+    task_ids = set()
     page = 1
 
     # Get a token
-    auth = requests.auth.HTTPBasicAuth(args.client_id, args.client_secret)
-    response = requests.post(
-        "https://stepik.org/oauth2/token/",
-        data={"grant_type": "client_credentials"},
-        auth=auth,
-    )
-    token = response.json().get("access_token", None)
+    token = get_token(args.client_id, args.client_secret, http)
     if not token:
         print("Unable to authorize with provided credentials")
         exit(1)
@@ -98,7 +131,7 @@ def main():
 
     # get grades data
     if args.class_id:
-        grades_meta = requests.get(
+        grades_meta = http.get(
             args.url
             + "/course-grades?course="
             + args.course_id
@@ -108,7 +141,7 @@ def main():
         )
         course_grades = check_access(grades_meta)
     else:  # get grades data $$$
-        grades_meta = requests.get(
+        grades_meta = http.get(
             args.url + "/course-grades?course=" + args.course_id + "&page=" + str(page),
             headers={"Authorization": "Bearer " + token},
         )
@@ -120,7 +153,9 @@ def main():
         if course_grades["course-grades"]:
             # print(f'Parse {page} page')
             for user in course_grades["course-grades"]:
-                grades = parse_grades(user, args.url, token, sorted_steps)
+                grades = parse_grades(
+                    user, args.url, token, sorted_steps, task_ids, http
+                )
                 grades_for_table.append(grades)
                 all_task_id.update(grades.keys())  # save all task id from student
             # print('Parsed!')
@@ -128,7 +163,7 @@ def main():
             if course_grades["meta"]["has_next"]:
                 page += 1
                 if args.class_id:
-                    grades_meta = requests.get(
+                    grades_meta = http.get(
                         args.url
                         + "/course-grades?course="
                         + args.course_id
@@ -139,7 +174,7 @@ def main():
                         headers={"Authorization": "Bearer " + token},
                     )
                 else:
-                    grades_meta = requests.get(
+                    grades_meta = http.get(
                         args.url
                         + "/course-grades?course="
                         + args.course_id
@@ -156,35 +191,55 @@ def main():
             break
             exit(1)
 
-    # output data to csv file
+    fields = ["user id", "full name", "last viewed", "total score"] + list(task_ids)
+    return grades_for_table, fields
+
+
+# Common exporter interface: write downloaded grades to sheet from args
+def write_table(args, df):
+    if args.sheet_id:
+        write_data_to_table_stepik(
+            None, args.google_token, args.table_id, sheet_id=args.sheet_id, df=df
+        )
+        print(f"Check data in your table! List id is: {args.sheet_id}")
+    else:
+        if args.sheet_name:
+            sheet_name = args.sheet_name
+        else:
+            sheet_name = "course " + args.course_id
+        write_data_to_table_stepik(
+            None, args.google_token, args.table_id, sheet_name=sheet_name, df=df
+        )
+        # logger.info(f'Check data in your table! List name is: {sheet_name}')
+
+
+def main(argv=None, session=None):
+    args = parse_args(argv)
+    grades_for_table, fields = fetch_grades(args, session)
+    df = pd.DataFrame(grades_for_table, columns=pd.Index(fields))
+
+    # output data to csv file: written from the rows, so scores of steps
+    # some students have not solved stay integers instead of becoming floats
     csv_path = args.csv_path + "_" + args.course_id + ".csv"
     with open(csv_path, "w", encoding="UTF8", newline="") as f:
-        global ALL_TASK_IDS
-        fields = ["user id", "full name", "last viewed", "total score"] + list(
-            ALL_TASK_IDS
-        )
         writer = csv.DictWriter(f, fieldnames=fields)
         writer.writeheader()
         writer.writerows(grades_for_table)
+    if args.columnar:
+        write_columnar(
+            df,
+            args.csv_path + "_" + args.course_id,
+            args.columnar,
+            datetime_columns=["last viewed"],
+            text_columns=["full name"],
+            integer_columns=["user id"],
+        )
     # print(f'Saved to csv file: {csv_path}')
 
     # write data to sheets document
     if args.google_token and args.table_id:
         # logger.debug('Send data to Google Sheets')
-        if args.sheet_id:
-            write_data_to_table_stepik(
-                csv_path, args.google_token, args.table_id, sheet_id=args.sheet_id
-            )
-            print(f"Check data in your table! List id is: {args.sheet_id}")
-        else:
-            if args.sheet_name:
-                sheet_name = args.sheet_name
-            else:
-                sheet_name = "course " + args.course_id
-            write_data_to_table_stepik(
-                csv_path, args.google_token, args.table_id, sheet_name=sheet_name
-            )
-            # logger.info(f'Check data in your table! List name is: {sheet_name}')
+        write_table(args, df)
         # logger.debug('********************************************************')
 
     # write data to yandex disk
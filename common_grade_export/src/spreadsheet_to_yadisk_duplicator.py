@@ -5,12 +5,15 @@
 
 import argparse
 import csv
+import hashlib
 import logging
 import sys
-from pathlib import Path
+from io import BytesIO
 
-from base_class import BaseGoogleSpreadsheetDataProcessor
-from utils.download_file import download_sheets
+from base_class import ERROR_RESULT, BaseGoogleSpreadsheetDataProcessor
+from utils.arg_parser import system_limit
+from utils.download_file import CSV_BUNDLE_FORMAT, download_sheets
+from utils.state_store import content_fingerprint
 from utils.yadisk_manager import DiskManager
 
 logging.basicConfig(
@@ -22,8 +25,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# форматы, экспорт которых побайтно повторяется для тех же данных: только их
+# имеет смысл сравнивать с хэшем файла на диске (pdf и xlsx содержат даты создания)
+REMOTE_HASH_FORMATS = ("csv", CSV_BUNDLE_FORMAT)
+
 
 class SpreadheetToYaDiskDuplicator(BaseGoogleSpreadsheetDataProcessor):
+    results_header = ["filename", "public_link"]
+
     def __init__(
         self,
         table_id: str,
@@ -31,6 +40,11 @@ class SpreadheetToYaDiskDuplicator(BaseGoogleSpreadsheetDataProcessor):
         google_cred: str,
         yadisk_token: str,
         yadisk_dir: str,
+        workers: int = 1,
+        system_limits: dict[str, int] | None = None,
+        state_path: str | None = None,
+        force: bool = False,
+        resume: bool = False,
     ):
         """
         Инициализация экспортера
@@ -41,16 +55,39 @@ class SpreadheetToYaDiskDuplicator(BaseGoogleSpreadsheetDataProcessor):
             google_cred (str): Путь к файлу учетных данных Google
             yadisk_token (str): OAuth-токен Яндекс.Диска
             yadisk_dir (str): Целевая директория на Яндекс.Диске
+            workers (int): Число одновременно обрабатываемых строк
+            system_limits (dict[str, int]): Ограничения одновременных обращений
+                к google (экспорт) и yadisk (загрузка)
+            state_path (str): Путь к SQLite-файлу состояния для пропуска неизменившихся файлов
+            force (bool): Загружать файлы независимо от сохраненного состояния
+            resume (bool): Продолжить последний незавершенный запуск, обрабатывая только
+                не завершенные в нем строки
         """
-        super().__init__(table_id=table_id, sheet_id=sheet_id, google_cred=google_cred)
+        super().__init__(
+            table_id=table_id,
+            sheet_id=sheet_id,
+            google_cred=google_cred,
+            workers=workers,
+            # конвейер: не более workers экспортов и workers загрузок одновременно,
+            # пока строка загружается, следующая уже экспортируется
+            system_limits={
+                "google": workers,
+                "yadisk": workers,
+                **(system_limits or {}),
+            },
+            state_path=state_path,
+            force=force,
+            resume=resume,
+        )
+        self.pool_size = 2 * self.workers
         self.yadisk_dir = yadisk_dir
         self.disk_manager = DiskManager(token=yadisk_token)
-        self.results = [["filename", "public_link"]]
 
     def process(self):
         """
         Обрабатывает данные экспорта
         """
+        self.start_run()
         control_data = self.get_control_data()
 
         if control_data:
@@ -64,29 +101,34 @@ class SpreadheetToYaDiskDuplicator(BaseGoogleSpreadsheetDataProcessor):
                     "export_name",
                 ],
             )
-            for export_line in control_data:
-                subject = export_line.pop("subject")
-                filepath = (
-                    f"{export_line['export_name']}.{export_line['export_format']}"
-                )
-                try:
-                    logger.info(f">>>>> Экспорт для дисциплины {subject}")
-                    link = self.process_data(**export_line)
-                    self.results.append([export_line["export_name"], link])
-                except Exception as e:
-                    logger.error(f"!!!!! Ошибка при экспорте дисциплины {subject}: {e}")
-                    self.results.append([export_line["export_name"], "- (error)"])
-                    self.set_errors_flag()
-                finally:
-                    logger.info(f">>>>> Конец экспорта для дисциплины {subject}")
-                    Path(filepath).unlink(missing_ok=True)  # remove from host
+            self.results.extend(self.map_rows(self.process_row, control_data))
 
             self.write_process_result()
+            self.log_throttling()
             return self.check_errors()
         else:
             logger.error("Ошибка получения данных для экспорта")
             return False
 
+    def process_row(self, export_line: dict) -> list[str]:
+        """
+        Экспортирует и загружает одну строку управляющей таблицы (в потоке пула)
+
+        Return:
+            list[str]: строка результата [filename, public_link]
+        """
+        subject = export_line.pop("subject")
+        try:
+            logger.info(f">>>>> Экспорт для дисциплины {subject}")
+            link = self.process_data(**export_line)
+            return [export_line["export_name"], link]
+        except Exception as e:
+            logger.error(f"!!!!! Ошибка при экспорте дисциплины {subject}: {e}")
+            self.set_errors_flag()
+            return [export_line["export_name"], ERROR_RESULT]
+        finally:
+            logger.info(f">>>>> Конец экспорта для дисциплины {subject}")
+
     def process_data(
         self,
         table_id: str,
@@ -101,34 +143,69 @@ class SpreadheetToYaDiskDuplicator(BaseGoogleSpreadsheetDataProcessor):
         """
         sheet_ids = [s.strip() for s in sheet_id.split(';')]
         
-        export_success = download_sheets(
-            table_id=table_id,
-            sheet_ids=sheet_ids,
-            export_format=export_format,
-            filename=export_name,
-            google_cred=self.google_cred,
-        )
+        # экспорт хранится только в памяти, без записи на диск контейнера
+        with self.system_limit("google"):
+            content = download_sheets(
+                table_id=table_id,
+                sheet_ids=sheet_ids,
+                export_format=export_format,
+                google_cred=self.google_cred,
+                write_to_file=False,
+            )
 
-        if not export_success:
+        if not content:
             raise Exception(f"download_sheets error")
 
-        public_link = self.upload_file_to_disk(f"{export_name}.{export_format}")
+        state_key = f"{table_id}|{sheet_id}|{export_format}|{self.yadisk_dir}/{export_name}"
+        fingerprint = content_fingerprint(content, export_format)
+        public_link = self.get_unchanged_output(state_key, fingerprint)
+        if public_link:
+            logger.info(f"Файл {export_name}.{export_format} не изменился, загрузка пропущена")
+            return public_link
+
+        with self.system_limit("yadisk"):
+            public_link = self.upload_file_to_disk(
+                content,
+                f"{export_name}.{export_format}",
+                check_remote=export_format in REMOTE_HASH_FORMATS,
+            )
         if not public_link:
             raise Exception(f"upload_file_to_disk error")
+        self.save_fingerprint(state_key, fingerprint, public_link)
         return public_link
 
-    def upload_file_to_disk(self, file_path: str):
-        """Загрузка файла на диск и его публикация
+    def upload_file_to_disk(self, content: bytes, file_name: str, check_remote: bool = True):
+        """Загрузка файла на диск и его публикация.
+        При check_remote, если на диске уже лежит файл с тем же содержимым
+        (по sha256/md5 из метаданных), загрузка пропускается и используется
+        его существующая публичная ссылка
 
         Args:
-            file_path (str): path to local file
+            content (bytes): export content
+            file_name (str): file name in yadisk_dir
+            check_remote (bool): compare content with the file on disk before upload
         Return:
             str: public link to file
         """
-        full_path = f"{self.yadisk_dir}/{file_path}"
-        self.disk_manager.upload(file_path, full_path)
+        full_path = f"{self.yadisk_dir}/{file_name}"
+        meta = self.disk_manager.get_file_meta(full_path) if check_remote else None
+        if meta is not None and self.is_same_content(content, meta):
+            logger.info(f"Файл {full_path} на диске не изменился, загрузка пропущена")
+            if meta.public_url:
+                return meta.public_url
+        else:
+            self.disk_manager.upload(BytesIO(content), full_path)
         return self.disk_manager.publish_file(full_path)
 
+    @staticmethod
+    def is_same_content(content: bytes, meta) -> bool:
+        """Сравнивает содержимое с хэшем файла на диске"""
+        if meta.sha256:
+            return hashlib.sha256(content).hexdigest() == meta.sha256
+        if meta.md5:
+            return hashlib.md5(content).hexdigest() == meta.md5
+        return False
+
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -149,7 +226,35 @@ def parse_args():
         required=True,
         help="Abs path to main Yadisk dir for upload/publish",
     )
+    parser.add_argument(
+        "--workers",
+        default=1,
+        type=int,
+        help="Number of control rows processed concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--system_limit",
+        type=system_limit,
+        action="append",
+        default=[],
+        help="Max concurrent calls for google (export) or yadisk (upload), e.g. yadisk=2 (can be repeated)",
+    )
+    parser.add_argument(
+        "--state_path",
+        default="export_state.sqlite",
+        help="Path to SQLite state file used to skip unchanged uploads (default: export_state.sqlite)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Upload all files even if they did not change since the last run",
+    )
 
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the last unfinished run of this control table, processing only unfinished rows",
+    )
     return parser.parse_args()
 
 
@@ -163,6 +268,11 @@ if __name__ == "__main__":
         google_cred=args.google_cred,
         yadisk_token=args.yadisk_token,
         yadisk_dir=args.yadisk_dir,
+        workers=args.workers,
+        system_limits=dict(args.system_limit),
+        state_path=args.state_path,
+        force=args.force,
+        resume=args.resume,
     )
 
     if not duplicator.process():
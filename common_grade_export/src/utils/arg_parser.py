@@ -1,7 +1,19 @@
 import argparse
 
+from utils.columnar import COLUMNAR_FORMATS
 
-def arg_parser_dis():
+
+def system_limit(value: str) -> tuple[str, int]:
+    """Parse 'system=N' limit of concurrent rows for a system"""
+    system, sep, limit = value.partition("=")
+    if not sep or not limit.isdigit() or int(limit) < 1:
+        raise argparse.ArgumentTypeError(
+            f"Expected <system>=<positive int>, got '{value}'"
+        )
+    return system.strip(), int(limit)
+
+
+def arg_parser_dis(argv: list[str] | None = None):
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--google_token",
@@ -22,6 +34,13 @@ def arg_parser_dis():
         required=False,
         help="Specify filter for slides-checker",
     )
+    parser.add_argument(
+        "--columnar",
+        choices=list(COLUMNAR_FORMATS),
+        required=False,
+        help="Also save the table as Parquet or Arrow IPC file next to dis_results.csv, "
+        "with numeric grade and datetime columns",
+    )
     parser.add_argument(
         "--table_id",
         type=str,
@@ -52,11 +71,11 @@ def arg_parser_dis():
         required=False,
         help="Specify output filename on Yandex Disk",
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     return args
 
 
-def arg_parser_moodle():
+def arg_parser_moodle(argv: list[str] | None = None):
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--moodle_token", type=str, required=True, help="Specify moodle token"
@@ -71,6 +90,13 @@ def arg_parser_moodle():
     parser.add_argument(
         "--csv_path", type=str, required=True, help="Specify path to output csv file"
     )
+    parser.add_argument(
+        "--columnar",
+        choices=list(COLUMNAR_FORMATS),
+        required=False,
+        help="Also save the table as Parquet or Arrow IPC file next to the csv, "
+        "with numeric grade and datetime columns",
+    )
     parser.add_argument(
         "--google_token",
         type=str,
@@ -107,6 +133,48 @@ def arg_parser_moodle():
         required=False,
         help="Specify output filename on Yandex Disk",
     )
+    parser.add_argument(
+        "--grades_backend",
+        choices=["table", "items"],
+        default="table",
+        help="table: scrape gradereport_user_get_grades_table html; "
+        "items: structured gradereport_user_get_grade_items (smaller payload)",
+    )
+    parser.add_argument(
+        "--course_workers",
+        type=int,
+        default=4,
+        help="Max courses exported concurrently (default: 4)",
+    )
+    parser.add_argument(
+        "--user_workers",
+        type=int,
+        default=0,
+        help="Fetch grades one user per request with this many concurrent requests "
+        "per course, for very large courses (default: 0, whole course in one request)",
+    )
+    parser.add_argument(
+        "--graded_roles",
+        type=lambda s: set(filter(None, s.split(","))),
+        default="student",
+        help="With --user_workers or --sync_dir, shortnames of roles whose grades are fetched, "
+        "as in the site gradebookroles setting (default: student; empty: all enrolled users)",
+    )
+    parser.add_argument(
+        "--sync_dir",
+        help="Directory with the previous export of each course; if set, only grades "
+        "of new users, users with changed last course access and users with submissions "
+        "newer than their grading are fetched (incremental sync, requires --grades_backend items). "
+        "Grades changed by a teacher without a pending submission (overrides, regrades) "
+        "are NOT detected and stay stale until the next full sync, see --full_sync_days",
+    )
+    parser.add_argument(
+        "--full_sync_days",
+        type=float,
+        default=7,
+        help="With --sync_dir, fetch grades of all users at least this often, "
+        "which bounds how long undetected regrades stay stale (default: 7)",
+    )
     parser.add_argument(
         "--percentages",
         required=False,
@@ -119,11 +187,14 @@ def arg_parser_moodle():
         required=False,
         help="Specify options for column names",
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    # the grades table has no grade timestamps to detect changed users
+    if args.sync_dir and args.grades_backend != "items":
+        parser.error("--sync_dir requires --grades_backend items")
     return args
 
 
-def arg_parser_stepik():
+def arg_parser_stepik(argv: list[str] | None = None):
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--client_id", type=str, required=True, help="app for stepic access"
@@ -139,6 +210,13 @@ def arg_parser_stepik():
     parser.add_argument(
         "--csv_path", type=str, required=True, help="Specify path to output csv file"
     )
+    parser.add_argument(
+        "--columnar",
+        choices=list(COLUMNAR_FORMATS),
+        required=False,
+        help="Also save the table as Parquet or Arrow IPC file next to the csv, "
+        "with numeric grade and datetime columns",
+    )
     parser.add_argument(
         "--google_token",
         type=str,
@@ -175,5 +253,5 @@ def arg_parser_stepik():
         required=False,
         help="Specify output filename on Yandex Disk",
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     return args
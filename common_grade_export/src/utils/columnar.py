@@ -0,0 +1,84 @@
+"""Запись таблиц оценок в колоночные форматы (Parquet, Arrow IPC) с типизированными столбцами"""
+
+from typing import Sequence
+
+import pandas as pd
+
+# формат -> расширение файла; запись через pandas требует pyarrow
+COLUMNAR_FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+# значения, означающие отсутствие оценки или даты
+MISSING_VALUES = {"", "-", "Never"}
+
+
+def to_numeric_column(column: pd.Series) -> pd.Series | None:
+    """
+    Приводит столбец к числам (в том числе с десятичной запятой).
+    None, если в столбце есть нечисловые значения кроме пропусков
+    """
+    if pd.api.types.is_numeric_dtype(column):
+        return column.astype("float64")
+    values = column.map(
+        lambda value: None
+        if pd.isna(value) or str(value).strip() in MISSING_VALUES
+        else str(value).strip().replace(",", ".").replace(" ", "")
+    )
+    numbers = pd.Series(pd.to_numeric(values, errors="coerce"), index=column.index)
+    if numbers.loc[values.notna()].isna().any():
+        return None
+    return numbers.astype("float64")
+
+
+def typed_grades(
+    df: pd.DataFrame,
+    datetime_columns: Sequence[str] = (),
+    text_columns: Sequence[str] = (),
+    integer_columns: Sequence[str] = (),
+) -> pd.DataFrame:
+    """
+    Типизирует таблицу оценок: datetime_columns - даты (пропуски - NaT),
+    text_columns - строки, integer_columns - целые (например, ID),
+    остальные столбцы - числа (float64, пропуски - NaN), если все их значения
+    числовые, иначе строки
+    """
+    typed = pd.DataFrame(index=df.index)
+    for name in df.columns:
+        column = pd.Series(df[name])
+        if name in datetime_columns:
+            typed[name] = pd.to_datetime(
+                column.where(~column.isin(list(MISSING_VALUES))), errors="coerce"
+            )
+            continue
+        numbers = None if name in text_columns else to_numeric_column(column)
+        if numbers is None:
+            typed[name] = column.astype("string")
+        elif name in integer_columns:
+            typed[name] = numbers.astype("Int64")
+        else:
+            typed[name] = numbers
+    # Parquet и Arrow требуют строковые имена столбцов
+    typed.columns = [str(name) for name in typed.columns]
+    return typed.reset_index(drop=True)
+
+
+def write_columnar(
+    df: pd.DataFrame,
+    path_base: str,
+    columnar_format: str,
+    datetime_columns: Sequence[str] = (),
+    text_columns: Sequence[str] = (),
+    integer_columns: Sequence[str] = (),
+) -> str:
+    """
+    Записывает таблицу оценок в файл {path_base}.parquet или {path_base}.arrow
+    (Arrow IPC / Feather v2) с типизированными столбцами, см. typed_grades
+
+    Return:
+        str: путь к записанному файлу
+    """
+    typed = typed_grades(df, datetime_columns, text_columns, integer_columns)
+    path = f"{path_base}.{COLUMNAR_FORMATS[columnar_format]}"
+    if columnar_format == "parquet":
+        typed.to_parquet(path, index=False)
+    else:
+        typed.to_feather(path)
+    return path
@@ -1,34 +1,76 @@
 import argparse
+import csv
 import gspread
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from io import BytesIO, StringIO
 import logging
-from openpyxl import load_workbook
+import json
+import os
+import sys
+import time
+from typing import IO, BinaryIO, Callable
 import requests
-from tempfile import NamedTemporaryFile
+import threading
 from pathlib import Path
-from google.oauth2 import service_account
-from google.auth.transport.requests import Request
-from PyPDF2 import PdfMerger
+from pypdf import PdfWriter
 from openpyxl import load_workbook, Workbook
+from openpyxl.utils import get_column_letter
+from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+
+from utils.export_cache import get_export_cache, get_spreadsheet_version
+from utils.google_auth import get_credential_manager
+from utils.http_session import create_session
+from utils.rate_limit import google_call
 
 logger = logging.getLogger(__name__)
 
+# число одновременных экспортов листов одной таблицы
+MAX_PARALLEL_EXPORTS = int(os.getenv("GOOGLE_MAX_PARALLEL_EXPORTS", "4"))
+# размер части при потоковой записи экспорта
+EXPORT_CHUNK_SIZE = 1024 * 1024
+# размер XLSX-файла листа, начиная с которого он пересохраняется потоково без оформления
+XLSX_STREAMING_SIZE = int(os.getenv("GOOGLE_XLSX_STREAMING_MB", "50")) * 1024 * 1024
+# число строк в части при экспорте листа диапазонами (0 - лист целиком)
+EXPORT_RANGE_ROWS = int(os.getenv("GOOGLE_EXPORT_RANGE_ROWS", "0"))
+# форматы, части которых можно склеить в один файл
+RANGE_EXPORT_FORMATS = ("csv", "xlsx")
+# zip-архив с CSV-файлом на каждый лист
+CSV_BUNDLE_FORMAT = "csv.zip"
+EXPORT_FORMATS = ("csv", "pdf", "xlsx", CSV_BUNDLE_FORMAT)
+# способ получения листов: export-url или Sheets API values.batchGet (только значения)
+EXPORT_BACKENDS = ("export", "values")
+EXPORT_BACKEND = os.getenv("GOOGLE_EXPORT_BACKEND", "export")
+VALUES_BACKEND_FORMATS = ("csv", "xlsx", CSV_BUNDLE_FORMAT)
+
+SHEETS_API_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+# размер пула соединений общей HTTP-сессии
+HTTP_POOL_SIZE = int(os.getenv("GOOGLE_HTTP_POOL_SIZE", "32"))
+
+
+_session = None
+_session_lock = threading.Lock()
 
-# TODO: class for google service
+
+def get_session() -> requests.Session:
+    """
+    Общая для процесса HTTP-сессия с пулом соединений к Google,
+    переиспользуемым всеми выгрузками
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session(HTTP_POOL_SIZE)
+        return _session
 
 
 def get_sheets_service_and_token(credentials_file="credentials.json"):
-    """Создает и возвращает сервис для работы с Google Sheets и API access_token"""
-    creds = service_account.Credentials.from_service_account_file(
-        credentials_file,
-        scopes=[
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive.file",
-        ],
-    )
-    client = gspread.authorize(creds)
-    creds.refresh(Request())
-    return client, creds.token
+    """
+    Возвращает общий для процесса клиент gspread и действующий API access_token
+    для файла учетных данных (без повторной авторизации при каждом вызове)
+    """
+    manager = get_credential_manager(credentials_file)
+    return manager.gspread_client, manager.get_token()
 
 
 def download_sheets(
@@ -38,154 +80,1004 @@ def download_sheets(
     export_format: str = "pdf",
     google_cred: str = "credentials.json",
     write_to_file: bool = True,
+    max_parallel_exports: int = MAX_PARALLEL_EXPORTS,
+    range_rows: int = EXPORT_RANGE_ROWS,
+    backend: str = EXPORT_BACKEND,
 ) -> bytes | None:
     """
-    Скачивает несколько листов и объединяет их в один файл
+    Скачивает несколько листов и объединяет их в один файл.
+    При write_to_file файл также сохраняется как {filename}.{export_format}.
+    Для записи без хранения файла в памяти - download_sheets_to
+
+    Return:
+        bytes | None: содержимое файла или None при ошибке
+    """
+    buffer = BytesIO()
+    if not download_sheets_to(
+        buffer,
+        table_id,
+        sheet_ids,
+        export_format,
+        google_cred,
+        max_parallel_exports,
+        range_rows=range_rows,
+        backend=backend,
+    ):
+        return None
+    content = buffer.getvalue()
+
+    if write_to_file:
+        try:
+            new_filepath = Path(f"{filename}.{export_format}")
+            new_filepath.parents[0].mkdir(parents=True, exist_ok=True)
+            new_filepath.write_bytes(content)
+        except OSError as e:
+            logger.error(f"Ошибка при сохранении файла: {e}")
+            return None
+        logger.debug(f"Файл сохранен как: {new_filepath}")
+    return content
+
+
+def download_sheets_to(
+    output: BinaryIO | str,
+    table_id: str,
+    sheet_ids: list[str],
+    export_format: str = "pdf",
+    google_cred: str = "credentials.json",
+    max_parallel_exports: int = MAX_PARALLEL_EXPORTS,
+    progress: Callable[[int, int | None], None] | None = None,
+    range_rows: int = EXPORT_RANGE_ROWS,
+    backend: str = EXPORT_BACKEND,
+) -> bool:
+    """
+    Скачивает несколько листов, объединяет их в один файл и потоково
+    записывает его в output: поток (например, поток загрузки) или путь к файлу.
+    Файл, запись которого не завершилась, удаляется.
+    Листы экспортируются параллельно, не более max_parallel_exports одновременно.
+    progress(записано байт, размер или None) сообщает о ходе потоковой записи.
+    Если задан range_rows, листы csv/xlsx экспортируются по частям из range_rows
+    строк в пределах используемого диапазона (см. export_sheet_ranges).
+    backend "values" получает csv/xlsx одним запросом values.batchGet
+    (см. write_sheets_values)
+
+    Return:
+        bool: True при успешной записи
     """
     try:
         client, access_token = get_sheets_service_and_token(google_cred)
-        
-        if len(sheet_ids) == 1:
-            content = export_file(table_id, sheet_ids[0], access_token, export_format)
-            if export_format == "xlsx" and content:
-                content = get_excel_with_values(content)
-        else:
-            if export_format == "pdf":
-                content = merge_multiple_pdfs(table_id, sheet_ids, access_token)
-            elif export_format == "xlsx":
-                content = merge_multiple_excels(table_id, sheet_ids, access_token)
-            else:
-                logger.warning(f"Формат {export_format} не поддерживает множественные листы, используется первый лист")
-                content = export_file(table_id, sheet_ids[0], access_token, export_format)
+        # версия таблицы нужна только для проверки кэша экспортов
+        version = (
+            get_spreadsheet_version(table_id, access_token)
+            if get_export_cache()
+            else None
+        )
 
-        if not content:
-            logger.error(f"Ошибка экспорта файла")
-            return None
+        if len(sheet_ids) > 1 and export_format not in ("pdf", "xlsx", CSV_BUNDLE_FORMAT):
+            logger.warning(f"Формат {export_format} не поддерживает множественные листы, используется первый лист (все листы: {CSV_BUNDLE_FORMAT})")
+            sheet_ids = sheet_ids[:1]
 
-        if write_to_file:
-            new_filepath = Path(f"{filename}.{export_format}")
+        def write(destination: BinaryIO) -> bool:
+            return write_sheets(
+                destination,
+                table_id,
+                sheet_ids,
+                access_token,
+                export_format,
+                version,
+                max_parallel_exports,
+                progress,
+                range_rows,
+                backend,
+            )
+
+        if isinstance(output, str):
+            new_filepath = Path(output)
             new_filepath.parents[0].mkdir(parents=True, exist_ok=True)
-            with open(new_filepath, "wb") as f:
-                f.write(content)
-            logger.debug(f"Файл сохранен как: {new_filepath}")
-        return content
+            success = False
+            try:
+                with open(new_filepath, "wb") as f:
+                    success = write(f)
+            finally:
+                # в том числе при исключении посреди потоковой записи
+                if not success:
+                    new_filepath.unlink(missing_ok=True)
+            if success:
+                logger.debug(f"Файл сохранен как: {new_filepath}")
+        else:
+            success = write(output)
+
+        if not success:
+            logger.error(f"Ошибка экспорта файла")
+        return success
 
     except Exception as e:
         logger.error(f"Ошибка при скачивании: {e}")
-        return None
+        return False
+
+
+def write_sheets(
+    output: BinaryIO,
+    table_id: str,
+    sheet_ids: list[str],
+    access_token: str,
+    export_format: str,
+    version: str | None = None,
+    max_parallel_exports: int = MAX_PARALLEL_EXPORTS,
+    progress: Callable[[int, int | None], None] | None = None,
+    range_rows: int = EXPORT_RANGE_ROWS,
+    backend: str = EXPORT_BACKEND,
+) -> bool:
+    """
+    Экспортирует листы и записывает результат (для нескольких листов -
+    объединенный файл) в output. Один лист в формате, не требующем обработки,
+    записывается потоково (см. export_file_to), progress вызывается только для него
+
+    Return:
+        bool: True, если результат записан
+    """
+    if backend == "values" and export_format in VALUES_BACKEND_FORMATS:
+        return write_sheets_values(output, table_id, sheet_ids, access_token, export_format)
 
+    if export_format == CSV_BUNDLE_FORMAT:
+        return write_csv_bundle(
+            output,
+            table_id,
+            sheet_ids,
+            access_token,
+            version,
+            max_parallel_exports,
+            range_rows,
+        )
+
+    if len(sheet_ids) > 1:
+        if export_format == "pdf":
+            return merge_multiple_pdfs(
+                output, table_id, sheet_ids, access_token, version, max_parallel_exports
+            )
+        if export_format == "xlsx":
+            return merge_multiple_excels(
+                output,
+                table_id,
+                sheet_ids,
+                access_token,
+                version,
+                max_parallel_exports,
+                range_rows,
+            )
+
+    if range_rows and export_format in RANGE_EXPORT_FORMATS:
+        # части уже склеены в файл со значениями
+        content = export_sheet_ranges(
+            table_id,
+            sheet_ids[0],
+            access_token,
+            export_format,
+            range_rows,
+            version,
+            max_parallel_exports,
+        )
+        if not content:
+            return False
+        output.write(content)
+        return True
 
-def merge_multiple_pdfs(table_id: str, sheet_ids: list[str], access_token: str) -> bytes:
+    if export_format != "xlsx":
+        return export_file_to(
+            output, table_id, sheet_ids[0], access_token, export_format, version, progress
+        )
+
+    content = export_file(table_id, sheet_ids[0], access_token, export_format, version)
+    if not content:
+        return False
+    write_excel_sheet(content, output)
+    return True
+
+
+def merge_multiple_pdfs(
+    output: BinaryIO,
+    table_id: str,
+    sheet_ids: list[str],
+    access_token: str,
+    version: str | None = None,
+    max_parallel_exports: int = MAX_PARALLEL_EXPORTS,
+) -> bool:
     """
-    Объединяет несколько PDF-файлов в один PDF-файл
+    Объединяет несколько PDF-файлов в один PDF-файл и записывает его в output.
+    Файлы добавляются из памяти, одинаковые объекты (шрифты и другие ресурсы,
+    общие для листов одной таблицы) сохраняются в результате один раз
+
+    Return:
+        bool: True, если экспортирован и записан хотя бы один лист
     """
-    merger = PdfMerger()
-    temp_files = []
-    
+    writer = PdfWriter()
     try:
-        for i, sheet_id in enumerate(sheet_ids):
-            pdf_content = export_file(table_id, sheet_id, access_token, "pdf")
+        pdf_contents = export_files(
+            table_id, sheet_ids, access_token, "pdf", version, max_parallel_exports
+        )
+        for index, pdf_content in enumerate(pdf_contents):
             if pdf_content:
-                with NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                    temp_file.write(pdf_content)
-                    temp_files.append(temp_file.name)
-                    merger.append(temp_file.name)
-        
-        merged_pdf = BytesIO()
-        merger.write(merged_pdf)
-        merger.close()
-        
-        return merged_pdf.getvalue()
-        
+                writer.append(BytesIO(pdf_content))
+            else:
+                logger.warning(f"Лист {sheet_ids[index]} не экспортирован, пропущен")
+        if not writer.pages:
+            return False
+
+        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+        writer.write(output)
+        return True
+
     finally:
-        for temp_file in temp_files:
-            try:
-                Path(temp_file).unlink(missing_ok=True)
-            except:
-                pass
+        writer.close()
+
+
+def merge_multiple_excels(
+    output: BinaryIO,
+    table_id: str,
+    sheet_ids: list[str],
+    access_token: str,
+    version: str | None = None,
+    max_parallel_exports: int = MAX_PARALLEL_EXPORTS,
+    range_rows: int = EXPORT_RANGE_ROWS,
+) -> bool:
+    """
+    Объединяет несколько листов в один XLSX-файл и записывает его в output
 
+    Return:
+        bool: True, если экспортирован и записан хотя бы один лист
+    """
+    excel_contents = export_files(
+        table_id,
+        sheet_ids,
+        access_token,
+        "xlsx",
+        version,
+        max_parallel_exports,
+        range_rows,
+    )
+    excel_contents = [content for content in excel_contents if content]
+    if not excel_contents:
+        return False
+    write_excel_values(excel_contents, output)
+    return True
 
-def merge_multiple_excels(table_id: str, sheet_ids: list[str], access_token: str) -> bytes:
+
+def write_excel_values(contents: list[bytes], output: BinaryIO):
     """
-    Объединяет несколько листов в один XLSX-файл
+    Записывает значения (не формулы) всех листов XLSX-файлов contents в один
+    XLSX-файл в output. Исходные файлы читаются построчно (read_only),
+    результат пишется потоково (write_only), поэтому расход памяти не зависит
+    от размера листов. Оформление ячеек не переносится
     """
-    merged_workbook = Workbook()    
+    merged_workbook = Workbook(write_only=True)
+    for content in contents:
+        source_workbook = load_workbook(BytesIO(content), read_only=True, data_only=True)
+        try:
+            for source_sheet in source_workbook.worksheets:
+                new_sheet = merged_workbook.create_sheet(title=source_sheet.title)
+                for row in source_sheet.iter_rows(values_only=True):
+                    new_sheet.append(row)
+        finally:
+            source_workbook.close()
+    merged_workbook.save(output)
+
+
+def write_excel_sheet(content: bytes, output: BinaryIO):
+    """
+    Записывает значения (не формулы) XLSX-файла листа в output, сохраняя
+    оформление (форматы чисел, объединенные ячейки, ширину столбцов).
+    Файлы от XLSX_STREAMING_SIZE байт пересохраняются потоково без оформления
+    (см. write_excel_values), чтобы не загружать их в память целиком
+    """
+    if len(content) >= XLSX_STREAMING_SIZE:
+        write_excel_values([content], output)
+        return
+    workbook = load_workbook(BytesIO(content), data_only=True)
     try:
-        for i, sheet_id in enumerate(sheet_ids):
-            excel_content = export_file(table_id, sheet_id, access_token, "xlsx")
-            if excel_content:
-                temp_wb = load_workbook(BytesIO(excel_content), data_only=True)
-                
-                for sheet_name in temp_wb.sheetnames:
-                    source_sheet = temp_wb[sheet_name]
-                    new_sheet = merged_workbook.create_sheet(title=f"{sheet_name}")
-                    
-                    for row in source_sheet.iter_rows():
-                        for cell in row:
-                            new_sheet[cell.coordinate].value = cell.value
-        
-        output = BytesIO()
-        merged_workbook.save(output)
-        output.seek(0)
-        
-        return output.getvalue()
-        
+        workbook.save(output)
     finally:
-        merged_workbook.close()
+        workbook.close()
 
 
 def get_excel_with_values(content: bytes) -> bytes:
     """
     Сохраняет значения (не формулы) листа таблицы в XLSX-файл
     """
-    wb = load_workbook(BytesIO(content), data_only=True)
-
     file_stream = BytesIO()
-    wb.save(file_stream)
-    file_stream.seek(0)
+    write_excel_sheet(content, file_stream)
+    return file_stream.getvalue()
 
-    return file_stream.read()
 
+def export_files(
+    table_id: str,
+    sheet_ids: list[str],
+    access_token: str,
+    export_format: str,
+    version: str | None = None,
+    max_parallel_exports: int = MAX_PARALLEL_EXPORTS,
+    range_rows: int = EXPORT_RANGE_ROWS,
+) -> list[bytes | None]:
+    """
+    Экспортирует несколько листов параллельно (не более max_parallel_exports
+    одновременно), результаты возвращаются в порядке sheet_ids.
+    При range_rows листы csv/xlsx экспортируются по частям, лимит
+    одновременных экспортов общий для листов и их частей
+    """
+    workers = max(1, min(max_parallel_exports, len(sheet_ids)))
+    export_slots = threading.BoundedSemaphore(max(1, max_parallel_exports))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(
+            executor.map(
+                lambda sheet_id: export_sheet(
+                    table_id,
+                    sheet_id,
+                    access_token,
+                    export_format,
+                    version,
+                    max_parallel_exports,
+                    range_rows,
+                    export_slots,
+                ),
+                sheet_ids,
+            )
+        )
 
-def export_file(
-    table_id: str, sheet_id: str, access_token: str, export_format: str
+
+def export_sheet(
+    table_id: str,
+    sheet_id: str,
+    access_token: str,
+    export_format: str,
+    version: str | None = None,
+    max_parallel_exports: int = MAX_PARALLEL_EXPORTS,
+    range_rows: int = EXPORT_RANGE_ROWS,
+    export_slots: threading.Semaphore | None = None,
 ) -> bytes | None:
     """
-    Экспортирует файл используя export-url
+    Экспортирует лист целиком или, при range_rows для csv/xlsx, по частям.
+    Каждый экспорт занимает место в export_slots, если лимит задан
     """
-    url = f"https://docs.google.com/spreadsheets/d/{table_id}/export?format={export_format}&gid={sheet_id}"
+    if range_rows and export_format in RANGE_EXPORT_FORMATS:
+        return export_sheet_ranges(
+            table_id,
+            sheet_id,
+            access_token,
+            export_format,
+            range_rows,
+            version,
+            max_parallel_exports,
+            export_slots,
+        )
+    with export_slots or nullcontext():
+        return export_file(table_id, sheet_id, access_token, export_format, version)
 
-    response = requests.get(url, headers={"Authorization": f"Bearer {access_token}"})
 
-    if response.status_code == 200:
-        return response.content
+def write_csv_bundle(
+    output: BinaryIO,
+    table_id: str,
+    sheet_ids: list[str],
+    access_token: str,
+    version: str | None = None,
+    max_parallel_exports: int = MAX_PARALLEL_EXPORTS,
+    range_rows: int = EXPORT_RANGE_ROWS,
+) -> bool:
+    """
+    Экспортирует листы в CSV параллельно и записывает их в zip-архив в output,
+    по файлу на лист с именем по названию листа. Файлы добавляются в порядке
+    sheet_ids по мере готовности. Даты файлов в архиве фиксированы, поэтому
+    архив с тем же содержимым совпадает побайтно
+
+    Return:
+        bool: True, если экспортированы и записаны все листы
+    """
+    titles = get_sheet_titles(table_id, access_token) or {}
+    workers = max(1, min(max_parallel_exports, len(sheet_ids)))
+    export_slots = threading.BoundedSemaphore(max(1, max_parallel_exports))
+    with ThreadPoolExecutor(max_workers=workers) as executor, ZipFile(output, "w") as archive:
+        contents = executor.map(
+            lambda sheet_id: export_sheet(
+                table_id,
+                sheet_id,
+                access_token,
+                "csv",
+                version,
+                max_parallel_exports,
+                range_rows,
+                export_slots,
+            ),
+            sheet_ids,
+        )
+        for sheet_id, content in zip(sheet_ids, contents):
+            if content is None:
+                logger.error(f"Лист {sheet_id} не экспортирован")
+                return False
+            add_csv_to_bundle(archive, titles.get(str(sheet_id), str(sheet_id)), content)
+    return True
+
+
+def add_csv_to_bundle(archive: ZipFile, title: str, content: bytes):
+    # "/" в названии листа создал бы в архиве директорию
+    info = ZipInfo(f"{title.replace('/', '_')}.csv", date_time=(1980, 1, 1, 0, 0, 0))
+    info.compress_type = ZIP_DEFLATED
+    archive.writestr(info, content)
+
+
+def write_sheets_values(
+    output: BinaryIO,
+    table_id: str,
+    sheet_ids: list[str],
+    access_token: str,
+    export_format: str,
+) -> bool:
+    """
+    Получает значения всех листов одним запросом values.batchGet и записывает
+    их в output в формате csv, xlsx или csv.zip без обращения к export-url.
+    Значения неформатированные (числа без форматирования ячеек), даты - строками
+
+    Return:
+        bool: True, если результат записан
+    """
+    sheets = get_sheets_values(table_id, sheet_ids, access_token)
+    if sheets is None:
+        return False
+
+    if export_format == "csv":
+        output.write(values_to_csv(sheets[0][1]))
+    elif export_format == CSV_BUNDLE_FORMAT:
+        with ZipFile(output, "w") as archive:
+            for title, rows in sheets:
+                add_csv_to_bundle(archive, title, values_to_csv(rows))
     else:
-        logger.error(f"export_file: Ошибка {response.status_code}: {response.text}")
+        workbook = Workbook(write_only=True)
+        for title, rows in sheets:
+            sheet = workbook.create_sheet(title=title)
+            for row in rows:
+                sheet.append(row)
+        workbook.save(output)
+    return True
+
+
+def get_sheets_values(
+    table_id: str, sheet_ids: list[str], access_token: str
+) -> list[tuple[str, list[list]]] | None:
+    """
+    Return:
+        list[tuple[str, list[list]]] | None: (название листа, строки значений)
+            в порядке sheet_ids или None при ошибке
+    """
+    titles = get_sheet_titles(table_id, access_token)
+    if titles is None:
         return None
+    missing = [sheet_id for sheet_id in sheet_ids if str(sheet_id) not in titles]
+    if missing:
+        logger.error(f"Листы {missing} не найдены в таблице {table_id}")
+        return None
+    sheet_titles = [titles[str(sheet_id)] for sheet_id in sheet_ids]
+
+    response = google_call(
+        "sheets_read",
+        get_session().get,
+        f"{SHEETS_API_URL}/{table_id}/values:batchGet",
+        params={
+            "ranges": ["'{}'".format(title.replace("'", "''")) for title in sheet_titles],
+            "majorDimension": "ROWS",
+            "valueRenderOption": "UNFORMATTED_VALUE",
+            "dateTimeRenderOption": "FORMATTED_STRING",
+            "fields": "valueRanges.values",
+        },
+        headers={"Authorization": f"Bearer {access_token}"},
+        timeout=60,
+    )
+    if response.status_code != 200:
+        logger.error(f"values.batchGet: Ошибка {response.status_code}: {response.text}")
+        return None
+
+    value_ranges = response.json().get("valueRanges", [])
+    return [
+        (title, value_range.get("values", []))
+        for title, value_range in zip(sheet_titles, value_ranges)
+    ]
+
+
+def values_to_csv(rows: list[list]) -> bytes:
+    """
+    Сериализует строки значений в CSV как export-url: разделитель строк
+    CRLF, строки дополнены до общей ширины, TRUE/FALSE для логических значений
+    """
+    width = max((len(row) for row in rows), default=0)
+    buffer = StringIO()
+    writer = csv.writer(buffer, lineterminator="\r\n")
+    for row in rows:
+        writer.writerow([format_csv_value(value) for value in row] + [""] * (width - len(row)))
+    return buffer.getvalue().removesuffix("\r\n").encode("utf-8")
+
+
+def format_csv_value(value):
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def get_sheet_properties(table_id: str, access_token: str) -> dict[str, dict] | None:
+    """
+    Return:
+        dict[str, dict] | None: ID листа (gid) -> свойства листа (title,
+            gridProperties) или None, если получить не удалось
+    """
+    try:
+        response = google_call(
+            "sheets_read",
+            get_session().get,
+            f"{SHEETS_API_URL}/{table_id}",
+            params={"fields": "sheets.properties(sheetId,title,gridProperties)"},
+            headers={"Authorization": f"Bearer {access_token}"},
+            timeout=30,
+        )
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.warning(f"Не удалось получить свойства листов таблицы {table_id}: {e}")
+        return None
+    return {
+        str(sheet["properties"]["sheetId"]): sheet["properties"]
+        for sheet in response.json().get("sheets", [])
+    }
+
+
+def get_sheet_titles(table_id: str, access_token: str) -> dict[str, str] | None:
+    """
+    Return:
+        dict[str, str] | None: ID листа (gid) -> название листа или None,
+            если получить не удалось
+    """
+    properties = get_sheet_properties(table_id, access_token)
+    if properties is None:
+        return None
+    return {sheet_id: sheet["title"] for sheet_id, sheet in properties.items()}
+
+
+def get_grid_size(
+    table_id: str, sheet_id: str, access_token: str
+) -> tuple[str, int, int] | None:
+    """
+    Определяет размер сетки листа по метаданным таблицы, без загрузки значений.
+    Сетка может включать пустые строки и столбцы в конце листа, они
+    отбрасываются при склейке частей (см. trim_empty_tail)
+
+    Return:
+        tuple[str, int, int] | None: (название листа, число строк, число столбцов)
+            или None, если определить не удалось
+    """
+    sheet = (get_sheet_properties(table_id, access_token) or {}).get(str(sheet_id))
+    if sheet is None:
+        logger.warning(f"Лист {sheet_id} не найден в таблице {table_id}")
+        return None
+    grid = sheet.get("gridProperties", {})
+    return sheet["title"], grid.get("rowCount", 0), grid.get("columnCount", 0)
+
+
+def export_sheet_ranges(
+    table_id: str,
+    sheet_id: str,
+    access_token: str,
+    export_format: str,
+    range_rows: int,
+    version: str | None = None,
+    max_parallel_exports: int = MAX_PARALLEL_EXPORTS,
+    export_slots: threading.Semaphore | None = None,
+) -> bytes | None:
+    """
+    Экспортирует сетку листа частями по range_rows строк (параметр range
+    export-url) параллельно и склеивает их в один csv/xlsx-файл без пустых
+    строк и столбцов в конце листа. Если размер сетки получить не удалось
+    или она пуста, лист экспортируется целиком.
+    export_slots - общий с экспортом других листов лимит одновременных экспортов
+    """
+    slots = export_slots or threading.BoundedSemaphore(max(1, max_parallel_exports))
+    grid_size = get_grid_size(table_id, sheet_id, access_token)
+    if grid_size is None or not grid_size[1] or not grid_size[2]:
+        with slots:
+            return export_file(table_id, sheet_id, access_token, export_format, version)
+    title, rows, columns = grid_size
+
+    last_column = get_column_letter(columns)
+    ranges = [
+        (start, min(start + range_rows - 1, rows))
+        for start in range(1, rows + 1, range_rows)
+    ]
+    logger.info(
+        f"Экспорт {table_id}:{sheet_id} диапазона A1:{last_column}{rows} частями: {len(ranges)}"
+    )
+
+    def export_part(bounds: tuple[int, int]) -> bytes | None:
+        with slots:
+            return export_file(
+                table_id,
+                sheet_id,
+                access_token,
+                export_format,
+                version,
+                f"A{bounds[0]}:{last_column}{bounds[1]}",
+            )
+
+    workers = max(1, min(max_parallel_exports, len(ranges)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        parts = [part for part in executor.map(export_part, ranges) if part is not None]
+    if len(parts) < len(ranges):
+        logger.error(f"Не удалось экспортировать часть листа {table_id}:{sheet_id}")
+        return None
+
+    part_rows = [end - start + 1 for start, end in ranges]
+    if export_format == "csv":
+        return join_csv_parts(parts, part_rows)
+
+    output = BytesIO()
+    join_excel_parts(parts, part_rows, title, output)
+    return output.getvalue()
+
+
+def trim_empty_tail(rows: list[list], fill=None) -> list[list]:
+    """
+    Отбрасывает пустые строки в конце и пустые столбцы справа,
+    дополняя строки значением fill до общей ширины
+    """
+    def is_empty(value) -> bool:
+        return value is None or value == ""
+
+    while rows and all(is_empty(value) for value in rows[-1]):
+        rows.pop()
+    columns = max(
+        (
+            max((i + 1 for i, value in enumerate(row) if not is_empty(value)), default=0)
+            for row in rows
+        ),
+        default=0,
+    )
+    return [row[:columns] + [fill] * (columns - len(row)) for row in rows]
+
+
+def join_csv_parts(parts: list[bytes], part_rows: list[int]) -> bytes:
+    """
+    Склеивает части CSV-файла, сохраняя разделитель строк экспорта.
+    Части дополняются пустыми строками до своего размера, так как экспорт
+    не содержит пустых строк в конце части
+    """
+    line_end = "\r\n" if any(b"\r\n" in part for part in parts) else "\n"
+    rows = []
+    for part, size in zip(parts, part_rows):
+        # строки разбираются через csv: значения могут содержать переводы строк
+        part_lines = list(csv.reader(StringIO(part.decode("utf-8"))))[:size]
+        rows.extend(part_lines)
+        rows.extend([] for _ in range(size - len(part_lines)))
+    rows = trim_empty_tail(rows, "")
+
+    output = StringIO()
+    writer = csv.writer(output, lineterminator=line_end)
+    for row in rows:
+        if any(row):
+            writer.writerow(row)
+        else:
+            # csv.writer записал бы пустую строку одного столбца как ""
+            output.write("," * (len(row) - 1) + line_end)
+    # экспорт Google не заканчивается переводом строки
+    return output.getvalue().removesuffix(line_end).encode("utf-8")
+
+
+def join_excel_parts(
+    parts: list[bytes],
+    part_rows: list[int],
+    title: str,
+    output: BinaryIO,
+):
+    """
+    Записывает значения частей листа (первый лист каждого XLSX-файла) в один
+    лист потоково. Части дополняются пустыми строками до своего размера,
+    так как экспорт не содержит пустых строк в конце части
+    """
+    rows = []
+    for part, size in zip(parts, part_rows):
+        part_workbook = load_workbook(BytesIO(part), read_only=True, data_only=True)
+        try:
+            written = 0
+            for row in part_workbook.worksheets[0].iter_rows(max_row=size, values_only=True):
+                rows.append(list(row))
+                written += 1
+            rows.extend([] for _ in range(size - written))
+        finally:
+            part_workbook.close()
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title)
+    for row in trim_empty_tail(rows):
+        sheet.append(row)
+    workbook.save(output)
+
+
+def export_file(
+    table_id: str,
+    sheet_id: str,
+    access_token: str,
+    export_format: str,
+    version: str | None = None,
+    cell_range: str | None = None,
+) -> bytes | None:
+    """
+    Экспортирует файл (или диапазон cell_range листа, например A1:Z5000)
+    используя export-url и возвращает его содержимое.
+    Если задана версия таблицы и включен кэш экспортов, экспорт той же
+    версии берется из кэша без обращения к Google
+    """
+    buffer = BytesIO()
+    if not export_file_to(
+        buffer,
+        table_id,
+        sheet_id,
+        access_token,
+        export_format,
+        version,
+        cell_range=cell_range,
+    ):
+        return None
+    return buffer.getvalue()
+
+
+def export_file_to(
+    output: BinaryIO,
+    table_id: str,
+    sheet_id: str,
+    access_token: str,
+    export_format: str,
+    version: str | None = None,
+    progress: Callable[[int, int | None], None] | None = None,
+    cell_range: str | None = None,
+) -> bool:
+    """
+    Экспортирует файл (или диапазон cell_range листа) используя export-url и потоково, частями по
+    EXPORT_CHUNK_SIZE, записывает его в output, не держа файл целиком в памяти.
+    При включенном кэше экспорт параллельно записывается в кэш
+
+    Args:
+        output (BinaryIO): Файл или поток, в который записывается экспорт
+        progress (Callable): Вызывается после каждой части с числом записанных
+            байт и размером файла (None, если размер не передан сервером)
+
+    Return:
+        bool: True, если экспорт записан полностью
+    """
+    cache = get_export_cache() if version else None
+    # диапазоны одного листа кэшируются отдельно
+    cache_sheet_id = f"{sheet_id}:{cell_range}" if cell_range else sheet_id
+    if cache and version:
+        cached_file = cache.open(table_id, cache_sheet_id, export_format, version)
+        if cached_file is not None:
+            with cached_file:
+                write_chunks(
+                    iter(lambda: cached_file.read(EXPORT_CHUNK_SIZE), b""),
+                    output,
+                    os.fstat(cached_file.fileno()).st_size,
+                    progress,
+                )
+            return True
+
+    url = f"https://docs.google.com/spreadsheets/d/{table_id}/export?format={export_format}&gid={sheet_id}"
+    if cell_range:
+        url += f"&range={cell_range}"
+
+    with google_call(
+        "export",
+        get_session().get,
+        url,
+        headers={"Authorization": f"Bearer {access_token}"},
+        stream=True,
+    ) as response:
+        if response.status_code != 200:
+            logger.error(f"export_file: Ошибка {response.status_code}: {response.text}")
+            return False
+
+        # при сжатии Content-Length - размер сжатого ответа, а не файла
+        total = (
+            None
+            if response.headers.get("Content-Encoding")
+            else response.headers.get("Content-Length")
+        )
+        cache_file = cache.create_entry_file() if cache else None
+        try:
+            write_chunks(
+                response.iter_content(EXPORT_CHUNK_SIZE),
+                output,
+                int(total) if total else None,
+                progress,
+                cache_file,
+            )
+        except Exception:
+            if cache_file:
+                cache_file.close()
+                os.unlink(cache_file.name)
+            raise
+
+    if cache and cache_file and version:
+        cache_file.close()
+        cache.put_file(table_id, cache_sheet_id, export_format, version, cache_file.name)
+    return True
+
+
+def write_chunks(
+    chunks,
+    output: BinaryIO,
+    total: int | None,
+    progress: Callable[[int, int | None], None] | None = None,
+    copy: IO[bytes] | None = None,
+):
+    """Записывает части файла в output (и в copy), сообщая о прогрессе"""
+    written = 0
+    for chunk in chunks:
+        output.write(chunk)
+        if copy:
+            copy.write(chunk)
+        written += len(chunk)
+        if progress:
+            progress(written, total)
+
+
+def load_manifest(path: str) -> list[dict]:
+    """
+    Загружает список выгрузок из JSON (список объектов) или CSV (с заголовком)
+    с полями table_id, sheet_ids, format, filename. sheet_ids - список или
+    строка с разделителем ";", format и filename необязательны
+
+    Return:
+        list[dict]: выгрузки с полями table_id, sheet_ids (list), format, filename
+    """
+    with open(path, encoding="utf-8", newline="") as file:
+        if path.endswith(".csv"):
+            items = list(csv.DictReader(file))
+        else:
+            items = json.load(file)
+
+    manifest = []
+    for index, item in enumerate(items):
+        if not item.get("table_id"):
+            raise ValueError(f"Манифест {path}: не задан table_id в записи {index + 1}")
+        sheet_ids = item.get("sheet_ids") or "0"
+        if isinstance(sheet_ids, str):
+            sheet_ids = sheet_ids.split(";")
+        manifest.append(
+            {
+                "table_id": item["table_id"],
+                "sheet_ids": [str(sheet_id).strip() for sheet_id in sheet_ids],
+                "format": item.get("format") or None,
+                "filename": item.get("filename") or f"export_{index + 1}",
+            }
+        )
+    return manifest
+
+
+def run_manifest(manifest: list[dict], args: argparse.Namespace) -> bool:
+    """
+    Выполняет выгрузки манифеста в одном процессе, не более args.jobs
+    одновременно, с общими токеном и пулом соединений. Печатает итог
+    по каждой выгрузке с временем выполнения
+
+    Return:
+        bool: True, если все выгрузки успешны
+    """
+
+    def run_item(item: dict) -> tuple[bool, float]:
+        start = time.perf_counter()
+        result = download_sheets_to(
+            f"{item['filename']}.{item['format'] or args.format}",
+            item["table_id"],
+            item["sheet_ids"],
+            item["format"] or args.format,
+            args.google_cred,
+            max_parallel_exports=args.parallel,
+            range_rows=args.range_rows,
+            backend=args.backend,
+        )
+        return result, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        results = list(executor.map(run_item, manifest))
+
+    print(f"{'status':<8}{'time, s':>10}{'size, KB':>12}  file")
+    for item, (success, elapsed) in zip(manifest, results):
+        path = Path(f"{item['filename']}.{item['format'] or args.format}")
+        size = f"{path.stat().st_size / 1024:.1f}" if success else "-"
+        print(f"{'ok' if success else 'FAILED':<8}{elapsed:>10.2f}{size:>12}  {path}")
+    failed = sum(not success for success, _ in results)
+    print(
+        f"Выгрузок: {len(results)}, с ошибками: {failed}, "
+        f"общее время: {time.perf_counter() - start:.2f} с"
+    )
+    return failed == 0
+
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Download Google Sheets")
-    parser.add_argument("--table_id", required=True, help="Google Sheets table ID")
+    parser.add_argument("--table_id", help="Google Sheets table ID")
+    parser.add_argument(
+        "--sheet_ids", default="0", type=lambda x: x.split(";"), help="Sheet IDs separated by ; (default: 0)"
+    )
+    parser.add_argument(
+        "--manifest",
+        help="JSON or CSV list of exports (table_id, sheet_ids, format, filename) "
+        "to run in one process instead of --table_id",
+    )
     parser.add_argument(
-        "--sheet_ids", required=True, default="0", type=lambda x: x.split(";"), help="Sheet IDs separated by ; (default: 0)"
+        "--jobs",
+        type=int,
+        default=4,
+        help="Max manifest exports run concurrently (default: 4)",
     )
     parser.add_argument(
-        "--format", choices=["csv", "pdf", "xlsx"], default="csv", help="Output format"
+        "--format",
+        choices=EXPORT_FORMATS,
+        default="csv",
+        help=f"Output format, {CSV_BUNDLE_FORMAT} is a zip with one CSV per sheet",
     )
     parser.add_argument(
         "--filename", default="export", help="Output filename (without extension)"
     )
-    parser.add_argument("--google_cred", help="Path to google credentials file")
+    parser.add_argument(
+        "--google_cred",
+        default="credentials.json",
+        help="Path to google credentials file (default: credentials.json)",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=MAX_PARALLEL_EXPORTS,
+        help=f"Max sheets exported concurrently (default: {MAX_PARALLEL_EXPORTS})",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=EXPORT_BACKENDS,
+        default=EXPORT_BACKEND,
+        help="export: export-url per sheet; values: one Sheets API values.batchGet "
+        "for csv/xlsx/csv.zip (unformatted values)",
+    )
+    parser.add_argument(
+        "--range_rows",
+        type=int,
+        default=EXPORT_RANGE_ROWS,
+        help="Export csv/xlsx sheets in concurrent row ranges of this size, "
+        "limited to the used range (default: 0, whole sheet)",
+    )
+    parser.add_argument(
+        "--progress", action="store_true", help="Print download progress to stderr"
+    )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if not args.table_id and not args.manifest:
+        parser.error("one of --table_id or --manifest is required")
+    return args
+
+
+def print_progress(written: int, total: int | None):
+    size = f" / {total / 2**20:.1f}" if total else ""
+    print(f"\r{written / 2**20:.1f}{size} MB", end="", file=sys.stderr, flush=True)
 
 
 def main():
     args = parse_args()
 
-    download_sheets(
-        args.table_id, args.sheet_ids, args.filename, args.format, args.google_cred
+    if args.manifest:
+        sys.exit(0 if run_manifest(load_manifest(args.manifest), args) else 1)
+
+    download_sheets_to(
+        f"{args.filename}.{args.format}",
+        args.table_id,
+        args.sheet_ids,
+        args.format,
+        args.google_cred,
+        max_parallel_exports=args.parallel,
+        progress=print_progress if args.progress else None,
+        range_rows=args.range_rows,
+        backend=args.backend,
     )
+    if args.progress:
+        print(file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+"""Дисковый кэш экспортов листов Google Sheets с проверкой версии таблицы"""
+
+import hashlib
+import os
+import threading
+from logging import getLogger
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import IO, BinaryIO
+
+import requests
+
+from utils.rate_limit import google_call
+
+logger = getLogger(__name__)
+
+# кэш включается заданием директории
+CACHE_DIR_ENV = "GOOGLE_EXPORT_CACHE_DIR"
+CACHE_MAX_MB_ENV = "GOOGLE_EXPORT_CACHE_MAX_MB"
+DEFAULT_CACHE_MAX_MB = 512
+
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_spreadsheet_version(table_id: str, access_token: str) -> str | None:
+    """
+    Возвращает версию таблицы из Drive API (version и modifiedTime),
+    меняющуюся при любом изменении таблицы. None, если получить не удалось
+    """
+    try:
+        response = google_call(
+            "drive",
+            requests.get,
+            f"{DRIVE_FILES_URL}/{table_id}",
+            params={"fields": "version,modifiedTime", "supportsAllDrives": "true"},
+            headers={"Authorization": f"Bearer {access_token}"},
+            timeout=30,
+        )
+    except requests.RequestException as e:
+        logger.warning(f"Не удалось получить версию таблицы {table_id}: {e}")
+        return None
+    if response.status_code != 200:
+        logger.warning(
+            f"Не удалось получить версию таблицы {table_id}: {response.status_code}"
+        )
+        return None
+    data = response.json()
+    return f"{data.get('version')}|{data.get('modifiedTime')}"
+
+
+class ExportCache:
+    """
+    Кэш экспортов по ключу (table_id, gid, format), действительный для одной
+    версии таблицы. Размер ограничен max_size байт, при превышении удаляются
+    давно не использованные записи (LRU по времени изменения файла)
+    """
+
+    def __init__(self, cache_dir: str, max_size: int):
+        """
+        Args:
+            cache_dir (str): Директория кэша
+            max_size (int): Максимальный суммарный размер записей в байтах
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, table_id: str, sheet_id: str, export_format: str) -> Path:
+        key = hashlib.sha256(f"{table_id}|{sheet_id}|{export_format}".encode()).hexdigest()
+        return self.cache_dir / key
+
+    def open(
+        self, table_id: str, sheet_id: str, export_format: str, version: str
+    ) -> BinaryIO | None:
+        """
+        Открывает для чтения экспорт, сохраненный для той же версии таблицы.
+        Открытый файл остается доступен, даже если запись будет вытеснена
+        """
+        path = self.entry_path(table_id, sheet_id, export_format)
+        with self.lock:
+            file = None
+            try:
+                if path.with_suffix(".version").read_text() == version:
+                    file = open(path.with_suffix(".bin"), "rb")
+                    # отметка использования для LRU
+                    os.utime(path.with_suffix(".bin"))
+            except FileNotFoundError:
+                pass
+
+            if file is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            logger.info(
+                f"Кэш экспорта {table_id}:{sheet_id}.{export_format}: "
+                f"{'попадание' if file is not None else 'промах'} "
+                f"(попаданий {self.hits}, промахов {self.misses})"
+            )
+            return file
+
+    def get(
+        self, table_id: str, sheet_id: str, export_format: str, version: str
+    ) -> bytes | None:
+        """Возвращает содержимое экспорта, если оно сохранено для той же версии таблицы"""
+        file = self.open(table_id, sheet_id, export_format, version)
+        if file is None:
+            return None
+        with file:
+            return file.read()
+
+    def create_entry_file(self) -> IO[bytes]:
+        """
+        Создает временный файл в директории кэша для потоковой записи экспорта,
+        который затем сохраняется в кэш через put_file
+        """
+        return NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False)
+
+    def put_file(
+        self,
+        table_id: str,
+        sheet_id: str,
+        export_format: str,
+        version: str,
+        temp_path: str,
+    ):
+        """Перемещает записанный временный файл в кэш"""
+        if os.path.getsize(temp_path) > self.max_size:
+            os.unlink(temp_path)
+            return
+        path = self.entry_path(table_id, sheet_id, export_format)
+        with self.lock:
+            os.replace(temp_path, path.with_suffix(".bin"))
+            path.with_suffix(".version").write_text(version)
+            self.evict()
+
+    def put(
+        self,
+        table_id: str,
+        sheet_id: str,
+        export_format: str,
+        version: str,
+        content: bytes,
+    ):
+        if len(content) > self.max_size:
+            return
+        with self.create_entry_file() as file:
+            file.write(content)
+        self.put_file(table_id, sheet_id, export_format, version, file.name)
+
+    def evict(self):
+        """Удаляет давно не использованные записи, пока размер кэша превышает лимит"""
+        entries = [
+            (entry.stat().st_mtime, entry.stat().st_size, entry)
+            for entry in self.cache_dir.glob("*.bin")
+        ]
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            entry.unlink(missing_ok=True)
+            entry.with_suffix(".version").unlink(missing_ok=True)
+            total_size -= size
+
+
+def get_export_cache() -> ExportCache | None:
+    """
+    Возвращает общий для процесса кэш экспортов или None, если он не включен.
+    Директория задается переменной окружения GOOGLE_EXPORT_CACHE_DIR,
+    лимит размера в МБ - GOOGLE_EXPORT_CACHE_MAX_MB
+    """
+    global _cache
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            max_mb = int(os.environ.get(CACHE_MAX_MB_ENV, DEFAULT_CACHE_MAX_MB))
+            _cache = ExportCache(cache_dir, max_mb * 1024 * 1024)
+        return _cache
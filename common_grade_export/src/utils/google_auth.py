@@ -0,0 +1,146 @@
+"""Общие для процесса учетные данные Google с упреждающим обновлением токена"""
+
+import fcntl
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+
+import gspread
+import pygsheets
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+from pygsheets.client import Client as PygsheetsClient
+
+logger = getLogger(__name__)
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+# токен обновляется заранее, если до истечения осталось меньше этого времени
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+# путь к файлу, через который токен разделяется между процессами (опционально)
+TOKEN_CACHE_ENV = "GOOGLE_TOKEN_CACHE"
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def utcnow() -> datetime:
+    # google-auth хранит expiry как naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class GoogleCredentialManager:
+    """
+    Учетные данные сервисного аккаунта из одного файла: кэширует клиентов
+    gspread/pygsheets и access token, обновляя его до истечения срока.
+    Если задан token_cache_path, токен разделяется между процессами через
+    файл, защищенный блокировкой
+    """
+
+    def __init__(self, credentials_file: str, token_cache_path: str | None = None):
+        """
+        Args:
+            credentials_file (str): Путь к файлу сервисного аккаунта Google
+            token_cache_path (str): Путь к файлу общего кэша токенов
+        """
+        self.credentials_file = credentials_file
+        self.token_cache_path = token_cache_path
+        self.credentials = service_account.Credentials.from_service_account_file(
+            credentials_file, scopes=SCOPES
+        )
+        self.cache_key = f"{self.credentials.service_account_email}|{' '.join(SCOPES)}"
+        self.lock = threading.Lock()
+        self._gspread_client = None
+        # pygsheets (httplib2) клиент не потокобезопасен - отдельный на поток
+        self._pygsheets_clients = threading.local()
+
+    def needs_refresh(self) -> bool:
+        return (
+            not self.credentials.token
+            or self.credentials.expiry is None
+            or self.credentials.expiry - utcnow() < TOKEN_REFRESH_MARGIN
+        )
+
+    def get_token(self) -> str:
+        """Возвращает действующий access token, при необходимости обновляя его"""
+        with self.lock:
+            if self.needs_refresh():
+                if self.token_cache_path:
+                    self.refresh_with_cache(self.token_cache_path)
+                else:
+                    self.refresh()
+            return self.credentials.token
+
+    def refresh(self):
+        self.credentials.refresh(Request())
+        logger.debug(f"Google token обновлен до {self.credentials.expiry}")
+
+    def refresh_with_cache(self, token_cache_path: str):
+        """
+        Берет токен из общего файла кэша, если он еще действителен, иначе
+        обновляет токен и записывает его в кэш. Файл заблокирован на время
+        операции, поэтому параллельные процессы не обновляют токен одновременно
+        """
+        with open(token_cache_path, "a+", encoding="utf-8") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.seek(0)
+                try:
+                    cache = json.loads(file.read() or "{}")
+                except json.JSONDecodeError:
+                    cache = {}
+
+                cached = cache.get(self.cache_key)
+                if cached:
+                    self.credentials.token = cached["token"]
+                    self.credentials.expiry = datetime.fromisoformat(cached["expiry"])
+                    if not self.needs_refresh():
+                        logger.debug("Google token получен из общего кэша")
+                        return
+
+                self.refresh()
+                cache[self.cache_key] = {
+                    "token": self.credentials.token,
+                    "expiry": self.credentials.expiry.isoformat(),
+                }
+                file.seek(0)
+                file.truncate()
+                file.write(json.dumps(cache))
+                file.flush()
+                os.fsync(file.fileno())
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    @property
+    def gspread_client(self) -> gspread.Client:
+        with self.lock:
+            if self._gspread_client is None:
+                self._gspread_client = gspread.authorize(self.credentials)
+            return self._gspread_client
+
+    @property
+    def pygsheets_client(self) -> PygsheetsClient:
+        client = getattr(self._pygsheets_clients, "client", None)
+        if client is None:
+            # токен обновляется через менеджер, чтобы pygsheets не делал это сам
+            self.get_token()
+            client = pygsheets.authorize(custom_credentials=self.credentials)
+            self._pygsheets_clients.client = client
+        return client
+
+
+def get_credential_manager(credentials_file: str) -> GoogleCredentialManager:
+    """
+    Возвращает общий для процесса менеджер учетных данных для файла.
+    Файл общего кэша токенов задается переменной окружения GOOGLE_TOKEN_CACHE
+    """
+    with _managers_lock:
+        if credentials_file not in _managers:
+            _managers[credentials_file] = GoogleCredentialManager(
+                credentials_file, os.environ.get(TOKEN_CACHE_ENV)
+            )
+        return _managers[credentials_file]
@@ -3,11 +3,18 @@ import os
 from io import StringIO
 
 import pandas as pd
-import pygsheets
+
+from utils.google_auth import get_credential_manager
+from utils.rate_limit import google_call
 
 CSV_DELIMITER = os.getenv("CSV_DELIMITER", ";")
 
 
+def get_pygsheets_client(google_token):
+    """Клиент pygsheets с общими для процесса учетными данными файла google_token"""
+    return get_credential_manager(google_token).pygsheets_client
+
+
 def add_csv_to_table(
     csv_filepath, workbook, sheet_name="export", delimiter=CSV_DELIMITER
 ):
@@ -31,8 +38,8 @@ def write_data_to_table(
     df_data, google_token, table_id, sheet_name=None, sheet_id=None
 ):
     if google_token and (sheet_name or sheet_id) and table_id:
-        gc = pygsheets.authorize(service_file=google_token)
-        sh = gc.open_by_key(table_id)
+        gc = get_pygsheets_client(google_token)
+        sh = google_call("sheets_read", gc.open_by_key, table_id)
 
     if sheet_id:
         wk_content = sh.worksheet("id", sheet_id)
@@ -40,7 +47,7 @@ def write_data_to_table(
         try:
             sh.worksheets("title", sheet_name)
         except:
-            sh.add_worksheet(sheet_name)
+            google_call("sheets_write", sh.add_worksheet, sheet_name)
 
         wk_content = sh.worksheet_by_title(sheet_name)
 
@@ -48,8 +55,15 @@ def write_data_to_table(
     #stream = StringIO(df_data.to_csv(sep=',', encoding='utf-8', decimal=','))
     #df = pd.read_csv(stream)
     #df_data = pd.DataFrame(df.to_dict("records"))
-    wk_content.clear()
-    wk_content.set_dataframe(df=df_data, start="A1", copy_head=True, copy_index=False)
+    google_call("sheets_write", wk_content.clear)
+    google_call(
+        "sheets_write",
+        wk_content.set_dataframe,
+        df=df_data,
+        start="A1",
+        copy_head=True,
+        copy_index=False,
+    )
 
 
 def add_csv_to_table_dis(
@@ -70,11 +84,11 @@ def add_csv_to_table_dis(
 
 
 def write_data_to_table_stepik(
-    csv_path, google_token, table_id, sheet_name=None, sheet_id=None
+    csv_path, google_token, table_id, sheet_name=None, sheet_id=None, df=None
 ):
     if google_token and (sheet_id or sheet_name) and table_id:
-        gc = pygsheets.authorize(service_file=google_token)
-        sh = gc.open_by_key(table_id)
+        gc = get_pygsheets_client(google_token)
+        sh = google_call("sheets_read", gc.open_by_key, table_id)
 
     if sheet_id:
         wk_content = sh.worksheet("id", sheet_id)
@@ -82,13 +96,14 @@ def write_data_to_table_stepik(
         try:
             sh.worksheets("title", sheet_name)
         except:
-            sh.add_worksheet(sheet_name)
+            google_call("sheets_write", sh.add_worksheet, sheet_name)
 
         wk_content = sh.worksheet_by_title(sheet_name)
 
-    if csv_path:
+    if df is None and csv_path:
         df = pd.read_csv(csv_path)
-        df.fillna(0, inplace=True)
+    if df is not None:
+        df = df.fillna(0)
         content = pd.DataFrame(df.to_dict("records"))
 
-    wk_content.set_dataframe(content, "A1", copy_head=True)
+    google_call("sheets_write", wk_content.set_dataframe, content, "A1", copy_head=True)
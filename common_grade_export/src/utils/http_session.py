@@ -0,0 +1,19 @@
+"""HTTP-сессии с пулом соединений, общие для потоков выгрузки"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# размер пула requests по умолчанию
+MIN_POOL_SIZE = 10
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """
+    Создает HTTP-сессию с пулом не менее pool_size соединений к каждому хосту,
+    чтобы одновременные запросы потоков переиспользовали соединения
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=max(pool_size, MIN_POOL_SIZE))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
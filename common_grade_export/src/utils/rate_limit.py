@@ -0,0 +1,224 @@
+"""Ограничение частоты запросов к Google и повтор запросов при превышении квот"""
+
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from logging import getLogger
+from typing import Callable, ParamSpec, TypeVar
+
+import requests
+
+logger = getLogger(__name__)
+
+# лимиты запросов в минуту по классам запросов, переопределяются переменной
+# окружения GOOGLE_RATE_LIMITS, например "sheets_read=120,export=30"
+RATE_LIMITS_ENV = "GOOGLE_RATE_LIMITS"
+DEFAULT_RATE_LIMITS = {
+    "export": 60,
+    "sheets_read": 60,
+    "sheets_write": 60,
+    "drive": 600,
+}
+MAX_RETRIES = int(os.getenv("GOOGLE_MAX_RETRIES", "5"))
+# максимальная пауза экспоненциальной задержки, секунд
+MAX_BACKOFF = 64
+# превышение квоты и временные ошибки сервера
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# записи могут быть применены до ответа 5xx (append_rows добавил бы строки
+# повторно, add_worksheet упал бы на существующем листе), поэтому для них
+# повторяется только 429: запрос отклонен до выполнения
+WRITE_ENDPOINTS = {"sheets_write"}
+WRITE_RETRY_STATUSES = {429}
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Token bucket с запасом на минуту запросов: до rate_per_minute запросов
+    выполняются сразу, дальше - с постоянной частотой. После ответа 429
+    частота снижается вдвое и постепенно восстанавливается после успешных запросов
+    """
+
+    def __init__(self, name: str, rate_per_minute: float):
+        """
+        Args:
+            name (str): Класс запросов (export, sheets_read, ...)
+            rate_per_minute (float): Допустимое число запросов в минуту
+        """
+        self.name = name
+        self.max_rate = rate_per_minute / 60
+        self.rate = self.max_rate
+        self.capacity = max(1.0, rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        # счетчики для итогов запуска
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self.backoff = 0.0
+
+    def acquire(self):
+        """Ждет разрешения на запрос. Ожидающие получают разрешения по очереди"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.requests += 1
+            # токен резервируется сразу, поэтому следующий запрос ждет дольше
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += wait
+        if wait:
+            time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_retry(self, status: int, attempt: int, retry_after: float | None) -> float:
+        """
+        Учитывает ответ, требующий повтора, и возвращает паузу перед повтором:
+        Retry-After, если сервер его передал, иначе экспоненциальную с разбросом
+        """
+        with self.lock:
+            if status == 429:
+                self.throttled += 1
+                self.rate = max(self.max_rate / 10, self.rate / 2)
+                self.tokens = min(self.tokens, 0.0)
+            if retry_after is None:
+                delay = min(MAX_BACKOFF, 2**attempt) + random.uniform(0, 1)
+            else:
+                delay = retry_after
+            self.backoff += delay
+        return delay
+
+
+def load_rate_limits() -> dict[str, float]:
+    limits: dict[str, float] = dict(DEFAULT_RATE_LIMITS)
+    for item in filter(None, os.getenv(RATE_LIMITS_ENV, "").split(",")):
+        name, _, value = item.partition("=")
+        limits[name.strip()] = float(value)
+    return limits
+
+
+def get_limiter(endpoint: str) -> TokenBucket:
+    """Возвращает общий для процесса ограничитель класса запросов endpoint"""
+    with _limiters_lock:
+        if endpoint not in _limiters:
+            limits = load_rate_limits()
+            if endpoint not in limits:
+                raise ValueError(f"Неизвестный класс запросов Google: {endpoint}")
+            _limiters[endpoint] = TokenBucket(endpoint, limits[endpoint])
+        return _limiters[endpoint]
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After в секундах: число секунд или HTTP-дата"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def get_error_status(error: Exception) -> tuple[int | None, float | None]:
+    """
+    Статус ответа и Retry-After из исключения requests/gspread
+    (response) или googleapiclient/pygsheets (resp)
+    """
+    response = getattr(error, "response", None)
+    if isinstance(response, requests.Response):
+        return response.status_code, parse_retry_after(response.headers.get("Retry-After"))
+    resp = getattr(error, "resp", None)
+    if resp is not None and getattr(resp, "status", None):
+        return int(resp.status), parse_retry_after(resp.get("retry-after"))
+    return None, None
+
+
+def google_call(endpoint: str, func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    """
+    Выполняет запрос func(*args, **kwargs) с ограничением частоты класса
+    запросов endpoint. При ответе 429/5xx (возвращенном requests.Response или
+    исключении клиента Google) запрос повторяется до MAX_RETRIES раз с паузой
+    Retry-After или экспоненциальной, записи (WRITE_ENDPOINTS) - только при 429.
+    Последний ответ возвращается как есть, последнее исключение пробрасывается
+    """
+    limiter = get_limiter(endpoint)
+    retry_statuses = WRITE_RETRY_STATUSES if endpoint in WRITE_ENDPOINTS else RETRY_STATUSES
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            status, retry_after = get_error_status(e)
+            if status not in retry_statuses or attempt == MAX_RETRIES:
+                raise
+        else:
+            if (
+                not isinstance(result, requests.Response)
+                or result.status_code not in retry_statuses
+                or attempt == MAX_RETRIES
+            ):
+                limiter.on_success()
+                return result
+            status = result.status_code
+            retry_after = parse_retry_after(result.headers.get("Retry-After"))
+            result.close()
+
+        delay = limiter.on_retry(status, attempt, retry_after)
+        logger.warning(
+            f"Google {endpoint}: ответ {status}, повтор через {delay:.1f} с "
+            f"(попытка {attempt + 1} из {MAX_RETRIES})"
+        )
+        time.sleep(delay)
+        attempt += 1
+
+
+def throttle_stats() -> dict[str, dict[str, float]]:
+    """
+    Return:
+        dict[str, dict[str, float]]: класс запросов -> счетчики requests,
+            throttled (ответов 429), waited и backoff (секунд ожидания)
+    """
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    stats = {}
+    for limiter in limiters:
+        with limiter.lock:
+            stats[limiter.name] = {
+                "requests": limiter.requests,
+                "throttled": limiter.throttled,
+                "waited": limiter.waited,
+                "backoff": limiter.backoff,
+            }
+    return stats
+
+
+def format_throttle_stats(before: dict, after: dict) -> str:
+    """Итоги ограничения запросов между двумя снимками throttle_stats()"""
+    parts = []
+    for name, counters in sorted(after.items()):
+        previous = before.get(name, {})
+        delta = {key: value - previous.get(key, 0) for key, value in counters.items()}
+        if delta["requests"]:
+            parts.append(
+                f"{name}: запросов {delta['requests']:.0f}, 429 - {delta['throttled']:.0f}, "
+                f"ожидание лимита {delta['waited']:.1f} с, повторы {delta['backoff']:.1f} с"
+            )
+    return "; ".join(parts) or "запросов не было"
@@ -0,0 +1,88 @@
+"""Расписания запусков: фиксированный интервал или cron-выражение"""
+
+from datetime import datetime, timedelta
+
+# (min, max) значений полей cron: минута, час, день месяца, месяц, день недели
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+# поиск следующего запуска ограничен годом (+ високосный день)
+CRON_SEARCH_LIMIT = timedelta(days=367)
+
+
+class IntervalSchedule:
+    """Запуск каждые interval секунд"""
+
+    def __init__(self, interval: float):
+        if interval <= 0:
+            raise ValueError(f"Интервал должен быть положительным: {interval}")
+        self.interval = timedelta(seconds=interval)
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + self.interval
+
+    def __str__(self):
+        return f"every {self.interval.total_seconds():g}s"
+
+
+class CronSchedule:
+    """
+    Запуск по cron-выражению из 5 полей: минута, час, день месяца, месяц, день недели.
+    Поддерживаются '*', числа, диапазоны 'a-b', списки 'a,b' и шаг '/n'.
+    День недели: 0-6, 0 (или 7) - воскресенье
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f"Cron-выражение должно содержать 5 полей: '{expression}'")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self.parse_field(field, low, high)
+            for field, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        # воскресенье можно задать как 7
+        self.weekdays = {weekday % 7 for weekday in self.weekdays}
+        # как в cron: если ограничены и день месяца, и день недели - достаточно любого
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def parse_field(field: str, low: int, high: int) -> set[int]:
+        values = set()
+        for part in field.split(","):
+            value_range, _, step = part.partition("/")
+            if value_range == "*":
+                start, end = low, high
+            elif "-" in value_range:
+                start, end = (int(v) for v in value_range.split("-", 1))
+            else:
+                start = int(value_range)
+                end = high if step else start
+            if start < low or end > high or start > end:
+                raise ValueError(f"Недопустимое значение cron-поля: '{field}'")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def matches_day(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        # datetime.weekday(): 0 - понедельник, в cron 0 - воскресенье
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + CRON_SEARCH_LIMIT
+        while candidate < limit:
+            if candidate.month not in self.months or not self.matches_day(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron-выражение '{self.expression}' не срабатывает в течение года")
+
+    def __str__(self):
+        return f"cron '{self.expression}'"
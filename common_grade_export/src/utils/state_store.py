@@ -0,0 +1,242 @@
+"""Локальное SQLite-хранилище состояния запусков экспорта"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from io import BytesIO
+from logging import getLogger
+from typing import cast
+
+from openpyxl import load_workbook
+
+logger = getLogger(__name__)
+
+# изменяемые при каждом экспорте поля PDF, не влияющие на содержимое
+PDF_VOLATILE_FIELDS = re.compile(
+    rb"/(CreationDate|ModDate)\s*\([^)]*\)|/ID\s*\[[^\]]*\]"
+)
+# число хранимых запусков одной управляющей таблицы, более старые удаляются
+KEEP_RUNS = 20
+
+
+def table_fingerprint(df) -> str:
+    """Отпечаток содержимого DataFrame (столбцы и значения)"""
+    return hashlib.sha256(df.to_csv(index=False).encode("utf-8")).hexdigest()
+
+
+def content_fingerprint(content: bytes, export_format: str) -> str:
+    """
+    Отпечаток содержимого экспортированного файла.
+    Для xlsx учитываются только листы и значения ячеек, для pdf - содержимое
+    без дат создания/изменения и ID документа, которые меняются при каждом экспорте
+    """
+    digest = hashlib.sha256()
+    if export_format == "xlsx":
+        wb = load_workbook(BytesIO(content), read_only=True, data_only=True)
+        try:
+            for ws in wb.worksheets:
+                digest.update(ws.title.encode("utf-8"))
+                for row in ws.iter_rows(values_only=True):
+                    digest.update(repr(row).encode("utf-8"))
+        finally:
+            wb.close()
+    elif export_format == "pdf":
+        digest.update(PDF_VOLATILE_FIELDS.sub(b"", content))
+    else:
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def row_key(row: dict) -> str:
+    """Ключ строки управляющей таблицы по ее содержимому"""
+    return hashlib.sha256(
+        json.dumps(row, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class StateStore:
+    """
+    Хранит отпечатки выгруженных данных по строкам управляющей таблицы,
+    чтобы не перезаписывать листы и файлы, содержимое которых не изменилось,
+    и манифесты запусков - статусы строк для продолжения прерванного запуска
+    """
+
+    def __init__(self, path: str = "export_state.sqlite", keep_runs: int = KEEP_RUNS):
+        """
+        Args:
+            path (str): Путь к файлу SQLite
+            keep_runs (int): Число хранимых последних запусков каждой управляющей таблицы
+        """
+        self.path = path
+        self.keep_runs = max(1, keep_runs)
+        self.lock = threading.Lock()
+        # соединение используется потоками пула обработки строк под self.lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    output TEXT,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    control_key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    started_at TEXT NOT NULL,
+                    finished_at TEXT
+                )
+                """
+            )
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS run_rows (
+                    run_id INTEGER NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    row_key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    output TEXT,
+                    PRIMARY KEY (run_id, row_index)
+                )
+                """
+            )
+
+    def get_fingerprint(self, key: str) -> tuple[str, str | None] | None:
+        """
+        Return:
+            tuple[str, str | None] | None: (отпечаток, результат экспорта) или None
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT fingerprint, output FROM fingerprints WHERE key = ?", (key,)
+            ).fetchone()
+
+    def set_fingerprint(self, key: str, fingerprint: str, output: str | None = None):
+        """
+        Сохраняет отпечаток и результат экспорта (например, публичную ссылку)
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO fingerprints (key, fingerprint, output, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, fingerprint, output, now()),
+            )
+
+    def start_run(self, control_key: str, resume: bool = False) -> int:
+        """
+        Создает запуск для управляющей таблицы или, при resume, возвращает последний
+        незавершенный (прерванный или с ошибками) запуск этой таблицы
+
+        Return:
+            int: ID запуска
+        """
+        with self.lock, self.connection:
+            if resume:
+                last_run = self.connection.execute(
+                    "SELECT run_id, status FROM runs WHERE control_key = ? "
+                    "ORDER BY run_id DESC LIMIT 1",
+                    (control_key,),
+                ).fetchone()
+                if last_run and last_run[1] != "done":
+                    self.connection.execute(
+                        "UPDATE runs SET status = 'running', finished_at = NULL "
+                        "WHERE run_id = ?",
+                        (last_run[0],),
+                    )
+                    return last_run[0]
+            # lastrowid задан после успешного INSERT
+            run_id = cast(int, self.connection.execute(
+                "INSERT INTO runs (control_key, status, started_at) "
+                "VALUES (?, 'running', ?)",
+                (control_key, now()),
+            ).lastrowid)
+            self.prune_runs(control_key)
+            return run_id
+
+    def prune_runs(self, control_key: str):
+        """Удаляет запуски управляющей таблицы старше последних keep_runs (под self.lock)"""
+        old_runs = "SELECT run_id FROM runs WHERE control_key = ? ORDER BY run_id DESC LIMIT -1 OFFSET ?"
+        self.connection.execute(
+            f"DELETE FROM run_rows WHERE run_id IN ({old_runs})",
+            (control_key, self.keep_runs),
+        )
+        self.connection.execute(
+            f"DELETE FROM runs WHERE run_id IN ({old_runs})",
+            (control_key, self.keep_runs),
+        )
+
+    def get_done_rows(self, run_id: int) -> dict[int, tuple[str, list]]:
+        """
+        Return:
+            dict[int, tuple[str, list]]: номер строки -> (ключ строки, результат)
+                для успешно обработанных строк запуска
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT row_index, row_key, output FROM run_rows "
+                "WHERE run_id = ? AND status = 'done'",
+                (run_id,),
+            ).fetchall()
+        return {index: (key, json.loads(output)) for index, key, output in rows}
+
+    def set_row_status(
+        self,
+        run_id: int,
+        row_index: int,
+        row_key: str,
+        status: str,
+        output: list | None = None,
+    ):
+        """
+        Сохраняет статус строки запуска: pending/running/done/failed
+        """
+        started_at = now() if status == "running" else None
+        finished_at = now() if status in ("done", "failed") else None
+        with self.lock, self.connection:
+            self.connection.execute(
+                """
+                INSERT INTO run_rows (run_id, row_index, row_key, status, started_at, finished_at, output)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (run_id, row_index) DO UPDATE SET
+                    row_key = excluded.row_key,
+                    status = excluded.status,
+                    started_at = COALESCE(excluded.started_at, run_rows.started_at),
+                    finished_at = excluded.finished_at,
+                    output = excluded.output
+                """,
+                (
+                    run_id,
+                    row_index,
+                    row_key,
+                    status,
+                    started_at,
+                    finished_at,
+                    json.dumps(output, ensure_ascii=False) if output is not None else None,
+                ),
+            )
+
+    def finish_run(self, run_id: int, status: str):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?",
+                (status, now(), run_id),
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -3,6 +3,7 @@
 from datetime import datetime
 from os import environ, path
 from logging import getLogger
+from typing import BinaryIO
 
 import yadisk
 
@@ -19,15 +20,16 @@ class DiskManager:
         self.client = yadisk.Client(token=token)
         self.download_path = download_path
 
-    def upload(self, local_path: str, disk_path: str, overwrite=True):
-        """upload from local_path to disk_path
+    def upload(self, local_path: str | BinaryIO, disk_path: str, overwrite=True):
+        """upload from local_path (or file-like object) to disk_path
 
         Args:
-            local_path (str): path to local file
+            local_path (str | BinaryIO): path to local file or file-like object opened in binary mode
             disk_path (str): full path to file on yadisk
             overwrite (bool): overwrite file. Defaults to true
         """
-        logger.info("Uploading %s to %s", *(local_path, disk_path))
+        source = local_path if isinstance(local_path, str) else "<stream>"
+        logger.info("Uploading %s to %s", *(source, disk_path))
         self.client.upload(local_path, disk_path, overwrite=overwrite)
 
     def download_file_from_disk(self, remote_path: str):
@@ -43,6 +45,22 @@ class DiskManager:
         self.client.download(remote_path, local_path)
         return local_path
 
+    def get_file_meta(self, remote_path: str):
+        """get file metadata with content hashes
+
+        Args:
+            remote_path (str): full path to file on yadisk
+
+        Returns:
+            ResourceObject | None: metadata (md5, sha256, public_url) or None if file doesn't exist
+        """
+        try:
+            return self.client.get_meta(
+                remote_path, fields=["path", "md5", "sha256", "public_url"]
+            )
+        except yadisk.exceptions.PathNotFoundError:
+            return None
+
     def publish_file(self, remote_path: str):
         """publish file
 
@@ -1,8 +1,17 @@
+from functools import lru_cache
+
 import pygsheets
 
+
+@lru_cache(maxsize=None)
+def get_client(google_token):
+    # authorize once per token file instead of on every read/write
+    return pygsheets.authorize(service_file=google_token)
+
+
 def read_ids_from_table(google_token, table_id, sheet_id, column_number):
     if google_token and sheet_id and table_id:
-        gc = pygsheets.authorize(service_file=google_token)
+        gc = get_client(google_token)
         sh = gc.open_by_key(table_id)
 
     try:
@@ -31,7 +40,7 @@ def write_data_to_table(df_data, google_token, table_id, sheet_id):
     df_data = df_data.sort_values(by='Joined the Google Developer Program')
 
     if google_token and sheet_id and table_id:
-        gc = pygsheets.authorize(service_file=google_token)
+        gc = get_client(google_token)
         sh = gc.open_by_key(table_id)
 
     try: